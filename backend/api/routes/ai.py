@@ -1,28 +1,28 @@
 from fastapi import APIRouter, BackgroundTasks, HTTPException
-import os
+from fastapi.responses import StreamingResponse
+import json
 import uuid
-from google.genai import Client
 
-from core.config import get_supabase_client
+from core.config import get_supabase_client, get_async_supabase
 from core.deps import get_current_user
 from core.ratelimit import RateLimiter
-from services.jobs import JOBS, run_agent_job, run_insights_job
-from services.ai_service import run_agent, run_insights_agent
+from services.jobs import run_agent_job, run_insights_job
+from services.jobs_store import set_status, get_status
+from services.ai_service import run_agent, run_insights_agent, stream_insights, get_gemini_client
 from fastapi import Depends
 
 router = APIRouter(prefix="/ai")
 
 @router.post("/run-agent")
 async def ai_run_agent(
+    background_tasks: BackgroundTasks,
     batch_size: int = 100, 
     threshold: float = 0.85,
     user: dict = Depends(get_current_user),
     _: None = Depends(RateLimiter(times=5, seconds=60)) # 5 requests per minute
 ):
     client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
-    return run_agent(client, batch_size, threshold, user_id=user.id, user_email=user.email)
+    return await run_agent(client, batch_size, threshold, user_id=user.id, user_email=user.email, background_tasks=background_tasks)
 
 @router.post("/generate-insights")
 async def ai_generate_insights(
@@ -31,21 +31,33 @@ async def ai_generate_insights(
     _: None = Depends(RateLimiter(times=3, seconds=300)) # 3 requests per 5 minutes
 ):
     client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
     
     job_id = str(uuid.uuid4())
-    JOBS[job_id] = {"status": "pending", "result": None, "error": None}
+    await set_status(job_id, "pending")
     background_tasks.add_task(run_insights_job, job_id, client, user.id)
     return {"job_id": job_id, "status": "pending", "message": "Insights generation started in background"}
 
+@router.post("/generate-insights-stream")
+async def ai_generate_insights_stream(
+    user: dict = Depends(get_current_user),
+    _: None = Depends(RateLimiter(times=3, seconds=300)) # 3 requests per 5 minutes
+):
+    client = get_supabase_client()
+
+    async def stream_gen():
+        # Each SSE event carries a JSON-encoded text chunk so newlines in the markdown survive
+        async for text in stream_insights(client, user.id):
+            yield f"data: {json.dumps(text)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(stream_gen(), media_type="text/event-stream")
+
 @router.get("/test-gemini")
 async def ai_test_gemini(prompt: str = "Say hello from Gemini", model: str = "gemini-2.5-flash-lite"):
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
+    client = get_gemini_client()
+    if not client:
         return {"ok": False, "error": "GEMINI_API_KEY not set", "response_text": "", "model": model, "prompt": prompt}
     try:
-        client = Client(api_key=api_key)
         model_name = model
         resp = client.models.generate_content(model=model_name, contents=prompt)
         text = getattr(resp, "text", "")
@@ -60,10 +72,9 @@ async def ai_test_gemini(prompt: str = "Say hello from Gemini", model: str = "ge
 
 @router.get("/list-models")
 async def list_models():
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
+    client = get_gemini_client()
+    if not client:
         return {"ok": False, "error": "GEMINI_API_KEY not set", "models": []}
-    client = Client(api_key=api_key)
     try:
         models = [getattr(m, "name", "") for m in client.models.list()]
         return {"ok": True, "models": models}
@@ -79,29 +90,25 @@ async def ai_run_agent_async(
     _: None = Depends(RateLimiter(times=5, seconds=60)) # 5 requests per minute
 ):
     client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
     job_id = str(uuid.uuid4())
-    JOBS[job_id] = {"status": "pending", "result": None, "error": None}
+    await set_status(job_id, "pending")
     background_tasks.add_task(run_agent_job, job_id, batch_size, threshold, client, user.id, user.email)
     return {"job_id": job_id, "status": "pending"}
 
 @router.get("/job-status/{job_id}")
 async def ai_job_status(job_id: str):
-    j = JOBS.get(job_id)
+    j = await get_status(job_id)
     if not j:
         raise HTTPException(status_code=404, detail="Job not found")
     return {"job_id": job_id, **j}
 
 @router.get("/insights")
 async def get_user_insights(user: dict = Depends(get_current_user)):
-    client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
+    client = get_async_supabase()
     
     # Fetch latest insight
     try:
-        res = client.table("user_insights") \
+        res = await client.table("user_insights") \
             .select("*") \
             .eq("user_id", user.id) \
             .order("created_at", desc=True) \
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException, Body, Depends
 from pydantic import BaseModel
-from core.config import get_supabase_client
+from core.config import get_supabase_client, get_async_supabase, sb, LOGIN_RATE_LIMIT, SIGNUP_RATE_LIMIT
 from core.deps import get_current_user
-from datetime import datetime, timedelta
-import calendar
+from core.ratelimit import AnonRateLimiter
+from core.rpc import rpc_or_fallback
+from utils.helpers import current_month_bounds
+import asyncio
+from collections import defaultdict
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -28,7 +31,7 @@ class ProfileUpdateRequest(BaseModel):
     country: str
 
 @router.post("/signup")
-async def signup(request: SignupRequest):
+async def signup(request: SignupRequest, _: None = Depends(AnonRateLimiter(times=SIGNUP_RATE_LIMIT, seconds=3600))):
     """
     Register a new user with email, password, and extended profile details.
     """
@@ -36,12 +39,10 @@ async def signup(request: SignupRequest):
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters long")
 
     client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
     
     try:
         # Sign up with email and password
-        auth_response = client.auth.sign_up({
+        auth_response = await sb(client.auth.sign_up, {
             "email": request.email,
             "password": request.password,
             "options": {
@@ -71,7 +72,7 @@ async def signup(request: SignupRequest):
                 "yearly_income": request.yearly_income,
                 "country": request.country
             }
-            client.table("users").upsert(profile_data).execute()
+            await sb(client.table("users").upsert(profile_data).execute)
         except Exception as e:
             # If inserting profile fails, we might want to warn, but we'll return success with warning or error
             # For strict consistency, we should probably fail, but user creation in auth worked.
@@ -91,16 +92,14 @@ async def signup(request: SignupRequest):
         raise HTTPException(status_code=400, detail=f"Signup failed: {str(e)}")
 
 @router.post("/login")
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, _: None = Depends(AnonRateLimiter(times=LOGIN_RATE_LIMIT, seconds=60))):
     """
     Login with email and password.
     """
     client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
         
     try:
-        response = client.auth.sign_in_with_password({
+        response = await sb(client.auth.sign_in_with_password, {
             "email": request.email,
             "password": request.password
         })
@@ -131,8 +130,6 @@ async def complete_profile(
     Requires authentication token.
     """
     client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
         
     try:
         data = {
@@ -144,105 +141,128 @@ async def complete_profile(
             "country": request.country
         }
         
-        client.table("users").upsert(data).execute()
+        await sb(client.table("users").upsert(data).execute)
         
         return {"message": "Profile updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to save profile: {str(e)}")
 
+IMPULSE_TAGS = frozenset({"impulse", "DopamineHit", "RetailTherapy", "BoredomBuy", "PaydaySplurge"})
+
+async def _profile_scores_rpc(client, user_id: str, start_date: str, end_date: str):
+    """
+    Budget adherence and impulse-buy scores computed by the profile_scores SQL function.
+    """
+    res = await client.rpc("profile_scores", {"uid": user_id, "d_start": start_date, "d_end": end_date}).execute()
+    row = res.data[0] if isinstance(res.data, list) else res.data
+    return float(row["budget_score"]), float(row["impulse_score"])
+
+async def _profile_scores_local(client, user_id: str, start_date: str, end_date: str):
+    """
+    Same scores as profile_scores, computed from the raw rows.
+    """
+    # Categories with Budget and Debit Transactions for Current Month, fetched together
+    cats_res, tx_res = await asyncio.gather(
+        client.table("categories").select("name,max_budget").eq("user_id", user_id).gt("max_budget", 0).execute(),
+        client.table("transactions")
+            .select("amount,category,tags")
+            .eq("user_id", user_id)
+            .eq("transaction_type", "Debit")
+            .gte("date", start_date)
+            .lte("date", end_date)
+            .execute(),
+    )
+    categories = cats_res.data or []
+    transactions = tx_res.data or []
+
+    # --- Budget Adherence Score ---
+    budget_adherence_score = 100.0 # Default if no budgets
+    
+    if categories:
+        # Aggregate spend by category
+        cat_spend = defaultdict(float)
+        for t in transactions:
+            c = t.get("category")
+            if c:
+                cat_spend[c] += t.get("amount") or 0
+        
+        total_overspend = 0.0
+        total_budget_limit = 0.0
+        
+        for cat in categories:
+            name = cat["name"]
+            limit = float(cat["max_budget"])
+            spent = cat_spend.get(name, 0)
+            
+            if spent > limit:
+                total_overspend += (spent - limit)
+            total_budget_limit += limit
+        
+        if total_budget_limit > 0:
+            # Score drops as overspend increases relative to total budget
+            # 0 overspend = 100
+            # Overspend = Total Budget -> 0
+            raw_score = 100.0 - (total_overspend / total_budget_limit * 100.0)
+            budget_adherence_score = max(0.0, min(100.0, raw_score))
+    
+    # --- Impulse Buy Score ---
+    total_spend = 0.0
+    impulse_spend = 0.0
+    
+    for t in transactions:
+        amount = t.get("amount") or 0
+        total_spend += amount
+        tags = t.get("tags")
+        # Check intersection
+        if tags and not IMPULSE_TAGS.isdisjoint(tags):
+             impulse_spend += amount
+    
+    impulse_buy_score = 0.0
+    if total_spend > 0:
+        impulse_buy_score = (impulse_spend / total_spend) * 100.0
+
+    return budget_adherence_score, impulse_buy_score
+
+async def _profile_scores(client, user_id: str):
+    """
+    Budget adherence and impulse-buy scores for the current month, rounded to one
+    decimal. Returns (None, None) if they can't be calculated.
+    """
+    try:
+        # Date Range: Current Month
+        start_date, end_date = current_month_bounds()
+
+        budget_adherence_score, impulse_buy_score = await rpc_or_fallback(
+            "profile_scores",
+            lambda: _profile_scores_rpc(client, user_id, start_date, end_date),
+            lambda: _profile_scores_local(client, user_id, start_date, end_date),
+        )
+
+        return round(budget_adherence_score, 1), round(impulse_buy_score, 1)
+
+    except Exception as e:
+        print(f"Error calculating profile scores: {e}")
+        return None, None
+
 @router.get("/profile")
 async def get_profile(user: dict = Depends(get_current_user)):
     """
     Get current user profile details with financial scores.
     """
-    client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
+    client = get_async_supabase()
     
     try:
-        response = client.table("users").select("*").eq("id", user.id).single().execute()
+        # The profile row and the scores don't depend on each other, so fetch them together
+        response, (budget_adherence_score, impulse_buy_score) = await asyncio.gather(
+            client.table("users").select("*").eq("id", user.id).single().execute(),
+            _profile_scores(client, user.id),
+        )
         if not response.data:
             raise HTTPException(status_code=404, detail="Profile not found")
         
         profile_data = response.data
-
-        # --- Calculate Scores (Budget Adherence & Impulse Buy) ---
-        try:
-            # Date Range: Current Month
-            now = datetime.now()
-            start_date = now.replace(day=1).strftime("%Y-%m-%d")
-            # Last day of month
-            _, last_day = calendar.monthrange(now.year, now.month)
-            end_date = now.replace(day=last_day).strftime("%Y-%m-%d")
-
-            # 1. Fetch Categories with Budget
-            cats_res = client.table("categories").select("name,max_budget").eq("user_id", user.id).gt("max_budget", 0).execute()
-            categories = cats_res.data or []
-
-            # 2. Fetch Debit Transactions for Current Month
-            tx_res = client.table("transactions") \
-                .select("amount,category,tags") \
-                .eq("user_id", user.id) \
-                .eq("transaction_type", "Debit") \
-                .gte("date", start_date) \
-                .lte("date", end_date) \
-                .execute()
-            transactions = tx_res.data or []
-
-            # --- Budget Adherence Score ---
-            budget_adherence_score = 100.0 # Default if no budgets
-            
-            if categories:
-                # Aggregate spend by category
-                cat_spend = {}
-                for t in transactions:
-                    c = t.get("category")
-                    if c:
-                        cat_spend[c] = cat_spend.get(c, 0) + (t.get("amount") or 0)
-                
-                total_overspend = 0.0
-                total_budget_limit = 0.0
-                
-                for cat in categories:
-                    name = cat["name"]
-                    limit = float(cat["max_budget"])
-                    spent = cat_spend.get(name, 0)
-                    
-                    if spent > limit:
-                        total_overspend += (spent - limit)
-                    total_budget_limit += limit
-                
-                if total_budget_limit > 0:
-                    # Score drops as overspend increases relative to total budget
-                    # 0 overspend = 100
-                    # Overspend = Total Budget -> 0
-                    raw_score = 100.0 - (total_overspend / total_budget_limit * 100.0)
-                    budget_adherence_score = max(0.0, min(100.0, raw_score))
-            
-            # --- Impulse Buy Score ---
-            # Impulse tags
-            impulse_tags = ["impulse", "DopamineHit", "RetailTherapy", "BoredomBuy", "PaydaySplurge"]
-            
-            total_spend = sum((t.get("amount") or 0) for t in transactions)
-            impulse_spend = 0.0
-            
-            for t in transactions:
-                tags = t.get("tags") or []
-                # Check intersection
-                if any(tag in impulse_tags for tag in tags):
-                     impulse_spend += (t.get("amount") or 0)
-            
-            impulse_buy_score = 0.0
-            if total_spend > 0:
-                impulse_buy_score = (impulse_spend / total_spend) * 100.0
-
-            profile_data["budget_adherence_score"] = round(budget_adherence_score, 1)
-            profile_data["impulse_buy_score"] = round(impulse_buy_score, 1)
-
-        except Exception as e:
-            print(f"Error calculating profile scores: {e}")
-            profile_data["budget_adherence_score"] = None
-            profile_data["impulse_buy_score"] = None
+        profile_data["budget_adherence_score"] = budget_adherence_score
+        profile_data["impulse_buy_score"] = impulse_buy_score
 
         return profile_data
     except Exception as e:
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, BackgroundTasks
 from typing import List, Optional
 from pydantic import BaseModel
-from core.config import get_supabase_client
+from core.config import get_supabase_client, get_async_supabase, get_redis_client, sb
 from core.deps import get_current_user
 from core.ratelimit import RateLimiter
-from services.budget_monitor import check_budget_and_notify
+from services.budget_monitor import budget_loader
+from services.ai_service import invalidate_categories_cache
+import orjson
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
@@ -28,14 +30,38 @@ DEFAULT_CATEGORIES = [
     "Transfer", "Income", "Other"
 ]
 
+# Category lists are read on most screens and only change through the write
+# routes below, which drop the cached copy.
+CATEGORIES_CACHE_TTL = 600
+
+def _categories_cache_key(user_id: str) -> str:
+    return f"cat:{user_id}"
+
+async def _drop_cached_categories(user_id: str):
+    invalidate_categories_cache(user_id)
+    redis = get_redis_client()
+    if redis:
+        try:
+            await redis.delete(_categories_cache_key(user_id))
+        except Exception as e:
+            print(f"Warning: failed to invalidate cached categories: {e}")
+
 @router.get("/", response_model=List[CategoryResponse])
 async def get_categories(user: dict = Depends(get_current_user)):
-    client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
+    reader = get_async_supabase()
+    redis = get_redis_client()
+    key = _categories_cache_key(user.id)
+
+    if redis:
+        try:
+            cached = await redis.get(key)
+            if cached:
+                return orjson.loads(cached)
+        except Exception:
+            pass # Fall back to the database
     
     try:
-        res = client.table("categories").select("*").eq("user_id", user.id).execute()
+        res = await reader.table("categories").select("*").eq("user_id", user.id).execute()
         categories = res.data
         
         # If no categories found, seed them
@@ -44,8 +70,15 @@ async def get_categories(user: dict = Depends(get_current_user)):
                 {"user_id": user.id, "name": cat, "max_budget": 0}
                 for cat in DEFAULT_CATEGORIES
             ]
-            res = client.table("categories").insert(seed_data).execute()
+            res = await sb(get_supabase_client().table("categories").insert(seed_data).execute)
             categories = res.data
+            invalidate_categories_cache(user.id)
+
+        if redis:
+            try:
+                await redis.setex(key, CATEGORIES_CACHE_TTL, orjson.dumps(categories))
+            except Exception:
+                pass
             
         return categories
     except Exception as e:
@@ -58,13 +91,12 @@ async def get_categories(user: dict = Depends(get_current_user)):
 @router.post("/", response_model=CategoryResponse)
 async def create_category(category: CategoryCreate, user: dict = Depends(get_current_user)):
     client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
     
     try:
         data = category.dict()
         data["user_id"] = user.id
-        res = client.table("categories").insert(data).execute()
+        res = await sb(client.table("categories").insert(data).execute)
+        await _drop_cached_categories(user.id)
         return res.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create category: {str(e)}")
@@ -73,23 +105,23 @@ async def create_category(category: CategoryCreate, user: dict = Depends(get_cur
 async def update_category(
     category_id: str, 
     category: CategoryUpdate, 
+    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_user),
     _: None = Depends(RateLimiter(times=10, seconds=3600))
 ):
     client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
     
     try:
         data = {k: v for k, v in category.dict().items() if v is not None}
-        res = client.table("categories").update(data).eq("id", category_id).eq("user_id", user.id).execute()
+        res = await sb(client.table("categories").update(data).eq("id", category_id).eq("user_id", user.id).execute)
         if not res.data:
             raise HTTPException(status_code=404, detail="Category not found")
+        await _drop_cached_categories(user.id)
         
         updated_cat = res.data[0]
-        # Check if new budget is already exceeded
+        # Check if new budget is already exceeded (after the response is sent)
         if "max_budget" in data and user.email:
-            check_budget_and_notify(user.id, user.email, updated_cat["name"])
+            background_tasks.add_task(budget_loader.enqueue, user.id, user.email, updated_cat["name"])
             
         return updated_cat
     except Exception as e:
@@ -1,12 +1,42 @@
 from fastapi import APIRouter, HTTPException, Query, Depends
 from typing import Optional, List, Dict, Any
-from core.config import get_supabase_client, TABLE_NAME
+from core.config import get_async_supabase, TABLE_NAME
 from core.deps import get_current_user
-import calendar
-from datetime import datetime, timedelta
+from core.rpc import rpc_or_fallback
+import re
+import asyncio
+import pandas as pd
+from utils.helpers import parse_month_bounds
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
 
+# Columns a client may request through ?fields=; the default is all of them
+TRANSACTION_FIELDS = [
+    "id", "date", "transaction_details", "transaction_type", "amount",
+    "statement_type", "category", "tags", "verification_status"
+]
+DEFAULT_TRANSACTION_FIELDS = ",".join(TRANSACTION_FIELDS)
+
+def _select_fields(fields: Optional[str]) -> str:
+    if not fields:
+        return DEFAULT_TRANSACTION_FIELDS
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in TRANSACTION_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {DEFAULT_TRANSACTION_FIELDS}")
+    # id and date are always returned; next_cursor is built from them
+    return ",".join(["id", "date"] + [f for f in requested if f not in ("id", "date")])
+
+# Keyset cursor: "<date>:<id>" of the last row on the previous page. date is the
+# column value as stored: YYYY-MM-DD, optionally with an ISO time and offset.
+_CURSOR_RE = re.compile(r"(\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}(?::?\d{2})?)?)?):([\w-]+)")
+
+def _parse_cursor(cursor: str):
+    m = _CURSOR_RE.fullmatch(cursor)
+    if not m:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return m[1], m[2]
+
 @router.get("/")
 async def get_transactions(
     start_date: Optional[str] = Query(None, description="Filter by start date (YYYY-MM-DD)"),
@@ -20,14 +50,19 @@ async def get_transactions(
     tags: Optional[List[str]] = Query(None, description="Filter by tags (one or more)"),
     search: Optional[str] = Query(None, description="Search in transaction details"),
     limit: int = Query(50, ge=1, le=1000),
-    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    offset: int = Query(0, ge=0, deprecated=True, description="Deprecated, use cursor. Ignored when cursor is given"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (default: all transaction fields)"),
     user: dict = Depends(get_current_user)
 ):
-    client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
+    """
+    Pages through the user's transactions, newest first. Pass next_cursor back
+    as cursor to get the following page. count is the planner's row estimate
+    for the filters, not an exact count.
+    """
+    client = get_async_supabase()
 
-    query = client.table(TABLE_NAME).select("*", count="exact").eq("user_id", user.id)
+    query = client.table(TABLE_NAME).select(_select_fields(fields), count="planned").eq("user_id", user.id)
 
     # Apply filters
     if start_date:
@@ -61,28 +96,176 @@ async def get_transactions(
     if search:
         query = query.ilike("transaction_details", f"%{search}%")
 
-    # Pagination
-    query = query.order("date", desc=True).range(offset, offset + limit - 1)
+    # Pagination (keyset on date desc, id desc; offset only for older clients)
+    query = query.order("date", desc=True).order("id", desc=True)
+    if cursor:
+        d, i = _parse_cursor(cursor)
+        query = query.or_(f'date.lt."{d}",and(date.eq."{d}",id.lt.{i})').limit(limit)
+    elif offset:
+        query = query.range(offset, offset + limit - 1)
+    else:
+        query = query.limit(limit)
 
     try:
-        result = query.execute()
+        result = await query.execute()
+        rows = result.data
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            next_cursor = f"{last['date']}:{last['id']}"
         return {
-            "data": result.data,
-            "count": result.count,
+            "data": rows,
+            "count": result.count, # planner estimate
             "limit": limit,
-            "offset": offset
+            "offset": None if cursor else offset,
+            "next_cursor": next_cursor
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching transactions: {str(e)}")
 
+# Behavioral tags shown on the stats bar chart (always present, 0 when unused)
+TARGET_TAGS = (
+    "DopamineHit", "RetailTherapy", "VampireSpend", "BoredomBuy", 
+    "PaydaySplurge", "WeekendWarrior", "SurvivalMode", "SubscriptionTrap", 
+    "MinimumDueTrap", "InterestLeak", "UtilizationSpike", "CreditRotation"
+)
+TARGET_TAGS_SET = frozenset(TARGET_TAGS)
+
+STATS_COLUMNS = ["amount", "transaction_type", "category", "tags", "statement_type", "verification_status"]
+
+def empty_transaction_stats() -> Dict[str, Any]:
+    return {
+        "overview": {"total_transactions": 0, "unverified": 0, "flagged": 0},
+        "charts": {
+            "category_debits": {},
+            "tag_spending": dict.fromkeys(TARGET_TAGS, 0.0),
+            "payment_type_distribution": {}
+        }
+    }
+
+def aggregate_transaction_stats(transactions: List[Dict[str, Any]], tag_rows: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Builds the /stats payload (overview counts and chart series) from raw rows.
+    tag_rows, when given, are the debit rows (amount, tags) used for the tag chart;
+    otherwise the tags on `transactions` are used.
+    """
+    df = pd.DataFrame(transactions, columns=STATS_COLUMNS)
+    df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0).astype(float)
+    df["category"] = df["category"].fillna("Uncategorized")
+    df["statement_type"] = df["statement_type"].fillna("Unknown")
+
+    status_counts = df["verification_status"].value_counts()
+
+    # 1. Category Pie (Debit only)
+    debit = df[df["transaction_type"] == "Debit"]
+    category_debits = debit.groupby("category", sort=False)["amount"].sum().to_dict()
+
+    # 2. Behavioral Tags (Debit only, summed by amount)
+    if tag_rows is not None:
+        tag_df = pd.DataFrame(tag_rows, columns=["amount", "tags"])
+        tag_df["amount"] = pd.to_numeric(tag_df["amount"], errors="coerce").fillna(0.0).astype(float)
+    else:
+        tag_df = debit
+    is_list = tag_df["tags"].map(lambda t: isinstance(t, list)).astype(bool)
+    tagged = tag_df.loc[is_list, ["amount", "tags"]].explode("tags")
+    tag_counts = (
+        tagged[tagged["tags"].isin(TARGET_TAGS_SET)]
+        .groupby("tags")["amount"].sum()
+        .reindex(TARGET_TAGS, fill_value=0.0)
+        .to_dict()
+    )
+
+    # 3. Payment Type Distribution (all activity)
+    payment_type_dist = df.groupby("statement_type", sort=False)["amount"].sum().to_dict()
+
+    return {
+        "overview": {
+            "total_transactions": len(df),
+            "unverified": int(status_counts.get("unverified", 0)),
+            "flagged": int(status_counts.get("required_human_verification", 0))
+        },
+        "charts": {
+            "category_debits": category_debits,
+            "tag_spending": tag_counts,
+            "payment_type_distribution": payment_type_dist
+        }
+    }
+
+async def transaction_stats_rpc(client, user_id: str, start_date: Optional[str], end_date: Optional[str]) -> Dict[str, Any]:
+    """
+    Same payload as aggregate_transaction_stats, computed by the transaction_stats SQL function.
+    """
+    res = await client.rpc("transaction_stats", {
+        "uid": user_id,
+        "d_start": start_date,
+        "d_end": end_date,
+        "target_tags": list(TARGET_TAGS)
+    }).execute()
+    stats = res.data
+    charts = stats["charts"]
+    # jsonb doesn't keep key order; keep the chart tags in their usual order
+    charts["tag_spending"] = {t: float(charts["tag_spending"].get(t) or 0) for t in TARGET_TAGS}
+    return stats
+
+# Rows per request when the stats are aggregated in Python
+STATS_PAGE_SIZE = 1000
+
+def _merge_transaction_stats(total: Dict[str, Any], page: Dict[str, Any]) -> None:
+    """
+    Adds one page's aggregate_transaction_stats payload into the running total.
+    """
+    for key, value in page["overview"].items():
+        total["overview"][key] += value
+    for chart, values in page["charts"].items():
+        acc = total["charts"][chart]
+        for key, value in values.items():
+            acc[key] = acc.get(key, 0.0) + value
+
+async def _transaction_stats_local(client, user_id: str, start_date: Optional[str], end_date: Optional[str]) -> Dict[str, Any]:
+    """
+    Same payload as transaction_stats_rpc, aggregated from the raw rows a page
+    (STATS_PAGE_SIZE rows) at a time, so a large account isn't pulled in one response.
+    """
+    def ranged(columns: str):
+        query = client.table(TABLE_NAME).select(columns).eq("user_id", user_id)
+        if start_date:
+            query = query.gte("date", start_date)
+        if end_date:
+            query = query.lte("date", end_date)
+        return query
+
+    def rows_query():
+        return ranged(",".join(c for c in STATS_COLUMNS if c != "tags"))
+
+    # Tag lists are only needed for debit rows carrying a chart tag, so those
+    # come from a second query filtered with tags && TARGET_TAGS (served by the
+    # GIN index on tags).
+    def tag_query():
+        return ranged("amount,tags").eq("transaction_type", "Debit").ov("tags", TARGET_TAGS)
+
+    async def fold(make_query, as_tag_rows: bool):
+        total = empty_transaction_stats()
+        offset = 0
+        while True:
+            res = await make_query().order("id").range(offset, offset + STATS_PAGE_SIZE - 1).execute()
+            batch = res.data or []
+            if batch:
+                page = aggregate_transaction_stats([], batch) if as_tag_rows else aggregate_transaction_stats(batch, [])
+                _merge_transaction_stats(total, page)
+            if len(batch) < STATS_PAGE_SIZE:
+                return total
+            offset += STATS_PAGE_SIZE
+
+    stats, tag_stats = await asyncio.gather(fold(rows_query, False), fold(tag_query, True))
+    stats["charts"]["tag_spending"] = tag_stats["charts"]["tag_spending"]
+    return stats
+
 @router.get("/stats")
 async def get_transaction_stats(
     month: Optional[str] = Query(None, description="Month to filter stats (YYYY-MM)"),
     user: dict = Depends(get_current_user)
 ):
-    client = get_supabase_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized")
+    client = get_async_supabase()
         
     try:
         # Date filtering logic
@@ -92,91 +275,15 @@ async def get_transaction_stats(
         if month:
             try:
                 # Parse YYYY-MM
-                date_obj = datetime.strptime(month, "%Y-%m")
-                start_date = date_obj.strftime("%Y-%m-01")
-                # Get last day of month
-                _, last_day = calendar.monthrange(date_obj.year, date_obj.month)
-                end_date = date_obj.replace(day=last_day).strftime("%Y-%m-%d")
+                start_date, end_date = parse_month_bounds(month)
             except ValueError:
                 raise HTTPException(status_code=400, detail="Invalid month format. Use YYYY-MM")
 
-        # 1. Fetch raw transactions for aggregation
-        query = client.table(TABLE_NAME).select("*").eq("user_id", user.id)
-        
-        if start_date:
-            query = query.gte("date", start_date)
-        if end_date:
-            query = query.lte("date", end_date)
-            
-        # Execute query
-        res = query.execute()
-        transactions = res.data if res.data else []
-        
-        # 2. Aggregates
-        total_count = len(transactions)
-        unverified_count = 0
-        flagged_count = 0
-        
-        # Chart Data Containers
-        category_debits = {} # Pie Chart 1
-        tag_counts = {}      # Bar Chart 2 (using count or sum? User asked for "debit transactions with these tags", usually sum of amount is more useful, or count. Let's do Amount for impact)
-                             # User said "Bar chart showing debit transactions with these tags". I'll assume Amount.
-        payment_type_dist = {} # Chart 3
-        
-        # Initialize specific tags to 0 to ensure they appear in chart even if empty? 
-        # Or just show what's there. User gave specific list. Let's initialize.
-        target_tags = [
-            "DopamineHit", "RetailTherapy", "VampireSpend", "BoredomBuy", 
-            "PaydaySplurge", "WeekendWarrior", "SurvivalMode", "SubscriptionTrap", 
-            "MinimumDueTrap", "InterestLeak", "UtilizationSpike", "CreditRotation"
-        ]
-        for t in target_tags:
-            tag_counts[t] = 0.0
-            
-        for tx in transactions:
-            # Basic stats
-            status = tx.get("verification_status", "unverified")
-            if status == "unverified":
-                unverified_count += 1
-            elif status == "required_human_verification":
-                flagged_count += 1
-                
-            # Chart Aggregations
-            amount = float(tx.get("amount", 0.0))
-            t_type = tx.get("transaction_type", "Debit") # Default to Debit if missing? Or check.
-            category = tx.get("category", "Uncategorized")
-            tags = tx.get("tags", [])
-            statement_type = tx.get("statement_type", "Unknown")
-            
-            # 1. Category Pie (Debit only usually, or all? User said "Pie chart showing debit scattered")
-            if t_type == "Debit":
-                if category not in category_debits:
-                    category_debits[category] = 0.0
-                category_debits[category] += amount
-                
-                # 2. Behavioral Tags (Debit only)
-                if tags and isinstance(tags, list):
-                    for tag in tags:
-                        if tag in tag_counts:
-                            tag_counts[tag] += amount
-                            
-            # 3. Payment Type Distribution (All transactions or just Debit? Usually all activity)
-            if statement_type not in payment_type_dist:
-                payment_type_dist[statement_type] = 0.0
-            payment_type_dist[statement_type] += amount
-
-        return {
-            "overview": {
-                "total_transactions": total_count,
-                "unverified": unverified_count,
-                "flagged": flagged_count
-            },
-            "charts": {
-                "category_debits": category_debits,
-                "tag_spending": tag_counts,
-                "payment_type_distribution": payment_type_dist
-            }
-        }
+        return await rpc_or_fallback(
+            "transaction_stats",
+            lambda: transaction_stats_rpc(client, user.id, start_date, end_date),
+            lambda: _transaction_stats_local(client, user.id, start_date, end_date),
+        )
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating stats: {str(e)}")
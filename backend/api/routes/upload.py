@@ -1,22 +1,43 @@
 from fastapi import APIRouter, File, UploadFile, HTTPException, status, BackgroundTasks, Form, Depends
 import os
-import shutil
 import uuid
+import asyncio
+import aiofiles
+from typing import List
+from starlette.formparsers import MultiPartParser
 
-from services.pdf_processor import extract_statement_data
 from utils.helpers import to_records, insert_supabase, normalize_statement_type
-from core.config import TABLE_NAME, get_supabase_client
+from core.config import TABLE_NAME, get_supabase_client, get_arq_pool
 from core.deps import get_current_user
 
 router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 1 << 20 # 1 MB
+
+def _copy_with_sendfile(src, dst_path):
+    """
+    Copies an on-disk upload to dst_path in kernel space (Linux sendfile).
+    """
+    src.flush()
+    src_fd = src.fileno()
+    size = os.fstat(src_fd).st_size
+    with open(dst_path, "wb") as dst:
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(dst.fileno(), src_fd, offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+
 def process_statement_task(path, job_id, original_filename=None, statement_type=None, user_id=None):
+    # Deferred so the API process doesn't load the PDF libraries when an arq worker does the parsing
+    from services.pdf_processor import extract_statement_data
     try:
         client = get_supabase_client()
         data = extract_statement_data(path, original_filename)
         records = to_records(data, statement_type, user_id)
         insert_supabase(client, TABLE_NAME, records)
-        print(f"Job {job_id} complete. Extracted {len(data)} rows.")
+        print(f"Job {job_id} complete. Extracted {len(records)} rows.")
     except Exception as e:
         print(f"Error processing job {job_id}: {e}")
     finally:
@@ -24,30 +45,99 @@ def process_statement_task(path, job_id, original_filename=None, statement_type=
             os.remove(path)
             print(f"Removed temp file: {path}")
 
+def process_statements_task(files, job_id, user_id=None):
+    """
+    Batch variant of process_statement_task. files is a list of
+    (path, original_filename, statement_type); the PDFs are parsed in parallel
+    and all their rows go out in one chunked upsert.
+    """
+    from services.pdf_processor import extract_statements
+    try:
+        client = get_supabase_client()
+        results = extract_statements([(path, name) for path, name, _ in files])
+        records = []
+        for (_, _, stype), data in zip(files, results):
+            records.extend(to_records(data, stype, user_id))
+        insert_supabase(client, TABLE_NAME, records)
+        print(f"Job {job_id} complete. Extracted {len(records)} rows from {len(files)} files.")
+    except Exception as e:
+        print(f"Error processing job {job_id}: {e}")
+    finally:
+        for path, _, _ in files:
+            if os.path.exists(path):
+                os.remove(path)
+                print(f"Removed temp file: {path}")
+
+async def _save_upload(file: UploadFile, temp_path: str):
+    # Uploads over Starlette's spool size (1 MB) have already been written to a
+    # real temp file; copy those with sendfile, smaller ones are still in memory.
+    # (fileno() isn't a usable probe: on a SpooledTemporaryFile it forces the rollover.)
+    if hasattr(os, "sendfile") and file.size is not None and file.size > MultiPartParser.spool_max_size:
+        await asyncio.to_thread(_copy_with_sendfile, file.file, temp_path)
+    else:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await buffer.write(chunk)
+
 @router.post("/upload-statement/", status_code=status.HTTP_202_ACCEPTED)
 async def upload_statement(
     background_tasks: BackgroundTasks, 
-    file: UploadFile = File(...), 
-    statement_type: str = Form(None), 
+    file: List[UploadFile] = File(...), 
+    statement_type: List[str] = Form(None), 
     user: dict = Depends(get_current_user)
 ):
-    if file.content_type != "application/pdf":
+    """
+    Accepts one or more PDFs under the repeated 'file' field. statement_type is
+    either a single value for every file or one value per file.
+    """
+    files = file
+    if any(f.content_type != "application/pdf" for f in files):
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDF files are allowed.")
+
+    raw_types = statement_type or [None]
+    if len(raw_types) == 1:
+        raw_types = raw_types * len(files)
+    elif len(raw_types) != len(files):
+        raise HTTPException(status_code=400, detail="Send one statement_type, or one per file.")
+    stypes = []
+    for raw in raw_types:
+        stype = normalize_statement_type(raw)
+        if raw and not stype:
+            raise HTTPException(status_code=400, detail="Invalid statement_type. Allowed: Credit Card, Bank, UPI")
+        stypes.append(stype)
     
     file_id = str(uuid.uuid4())
-    temp_path = os.path.join("uploads", f"temp_{file_id}.pdf")
+    temp_paths = [
+        os.path.join("uploads", f"temp_{file_id}.pdf" if len(files) == 1 else f"temp_{file_id}_{i}.pdf")
+        for i in range(len(files))
+    ]
     
     try:
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        for f, temp_path in zip(files, temp_paths):
+            await _save_upload(f, temp_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Could not save file: {str(e)}")
     
-    stype = normalize_statement_type(statement_type)
-    if statement_type and not stype:
-        raise HTTPException(status_code=400, detail="Invalid statement_type. Allowed: Credit Card, Bank, UPI")
-    
-    # Pass user_id from the authenticated user to the background task
-    background_tasks.add_task(process_statement_task, temp_path, file_id, file.filename, stype, user.id)
+    # Hand the file(s) to the arq worker when USE_ARQ_WORKER is set; otherwise
+    # process them in this process after the response is sent.
+    # Pass user_id from the authenticated user to the task
+    if len(files) == 1:
+        task, job_name = process_statement_task, "process_statement"
+        args = (temp_paths[0], file_id, files[0].filename, stypes[0], user.id)
+    else:
+        task, job_name = process_statements_task, "process_statements"
+        args = (list(zip(temp_paths, [f.filename for f in files], stypes)), file_id, user.id)
+    queued = False
+    try:
+        pool = await get_arq_pool()
+        if pool:
+            await pool.enqueue_job(job_name, *args, _job_id=file_id)
+            queued = True
+    except Exception as e:
+        print(f"Warning: could not enqueue job {file_id}, processing in-process: {e}")
+    if not queued:
+        background_tasks.add_task(task, *args)
     
-    return {"message": "File uploaded successfully", "job_id": file_id}
+    if len(files) == 1:
+        return {"message": "File uploaded successfully", "job_id": file_id}
+    return {"message": "Files uploaded successfully", "job_id": file_id, "file_count": len(files)}
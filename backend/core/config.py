@@ -1,7 +1,11 @@
 import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import httpx
 from utils.helpers import create_supabase_client
+from core.supabase_async import AsyncSupabase
 import redis.asyncio as redis
 
 load_dotenv()
@@ -9,6 +13,16 @@ load_dotenv()
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 REDIS_URL = os.environ.get("REDIS_URL")
+# Statement parsing goes to the arq worker (worker.py) only when this is set, and
+# that worker must then be running and share the API's uploads/ directory.
+USE_ARQ_WORKER = os.environ.get("USE_ARQ_WORKER", "").lower() in ("1", "true", "yes")
+
+# Comma-separated browser origins allowed by CORS (e.g. the web dashboard)
+CORS_ORIGINS = [o.strip() for o in os.environ.get("CORS_ORIGINS", "*").split(",") if o.strip()]
+
+# Per-IP limits on the unauthenticated auth routes (requests per window; 0 disables)
+LOGIN_RATE_LIMIT = int(os.environ.get("LOGIN_RATE_LIMIT", 10)) # per minute
+SIGNUP_RATE_LIMIT = int(os.environ.get("SIGNUP_RATE_LIMIT", 5)) # per hour
 
 # Email Configuration
 SMTP_SERVER = os.environ.get("SMTP_SERVER", "smtp.gmail.com")
@@ -18,18 +32,48 @@ SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD")
 SMTP_FROM_EMAIL = os.environ.get("SMTP_FROM_EMAIL", SMTP_USERNAME)
 
 TABLE_NAME = "transactions"
+
+# Blocking supabase-py calls made from async code run on this pool. It is kept
+# well below Supabase's connection limit, even with a couple of API replicas.
+SB_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="sb")
+
+async def sb(fn, *args, **kwargs):
+    """
+    Runs a blocking supabase-py call (e.g. query.execute) on SB_POOL.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(SB_POOL, functools.partial(fn, *args, **kwargs))
+
 supabase_client = None
+async_supabase = None
 redis_client = None
+arq_pool = None
+
+def _require_supabase_config():
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise RuntimeError("Supabase URL/Key not configured. Set SUPABASE_URL and SUPABASE_KEY.")
 
 def get_supabase_client():
+    """
+    Shared supabase-py client. Never returns None: it is created by
+    startup_initialize (or on first use) and raises if it can't be.
+    """
     global supabase_client
-    if supabase_client:
-        return supabase_client
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        return None
-    supabase_client = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
+    if supabase_client is None:
+        _require_supabase_config()
+        client = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
+        if not client:
+            raise RuntimeError("Failed to create Supabase client.")
+        supabase_client = client
     return supabase_client
 
+def get_async_supabase():
+    global async_supabase
+    if async_supabase is None:
+        _require_supabase_config()
+        async_supabase = AsyncSupabase(SUPABASE_URL, SUPABASE_KEY)
+    return async_supabase
+
 def get_redis_client():
     global redis_client
     if redis_client:
@@ -39,11 +83,24 @@ def get_redis_client():
     redis_client = redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
     return redis_client
 
+async def get_arq_pool():
+    """
+    Connection used to enqueue jobs for the arq worker (worker.py). None unless
+    USE_ARQ_WORKER and REDIS_URL are both set.
+    """
+    global arq_pool
+    if arq_pool:
+        return arq_pool
+    if not USE_ARQ_WORKER or not REDIS_URL:
+        return None
+    from arq import create_pool
+    from arq.connections import RedisSettings
+    arq_pool = await create_pool(RedisSettings.from_dsn(REDIS_URL))
+    return arq_pool
+
 async def startup_initialize():
-    global supabase_client
     global redis_client
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        raise RuntimeError("Supabase URL/Key not configured. Set SUPABASE_URL and SUPABASE_KEY.")
+    _require_supabase_config()
     try:
         async with httpx.AsyncClient(timeout=5) as client:
             r = await client.get(f"{SUPABASE_URL}/rest/v1/", headers={"apikey": SUPABASE_KEY, "Authorization": f"Bearer {SUPABASE_KEY}"})
@@ -51,9 +108,8 @@ async def startup_initialize():
                 raise RuntimeError(f"Supabase REST not reachable: {r.status_code}")
     except Exception as e:
         raise RuntimeError(f"Supabase connectivity check failed: {e}")
-    supabase_client = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
-    if not supabase_client:
-        raise RuntimeError("Failed to create Supabase client.")
+    get_supabase_client()
+    get_async_supabase()
 
     # Initialize Redis
     if REDIS_URL:
@@ -90,3 +146,14 @@ async def startup_initialize():
                  print("Warning: 'user_insights' table not found. Please create it to save insights.")
     except Exception as e:
         raise RuntimeError(f"Supabase table check failed: {e}")
+
+async def shutdown_cleanup():
+    global async_supabase
+    if async_supabase:
+        await async_supabase.aclose()
+        async_supabase = None
+    SB_POOL.shutdown(wait=False)
+    from services.email_service import close_smtp_connection
+    from services.pdf_processor import shutdown_page_pool
+    close_smtp_connection()
+    shutdown_page_pool()
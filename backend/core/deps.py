@@ -1,35 +1,73 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from core.config import get_supabase_client
+from core.config import get_supabase_client, get_redis_client, sb
+from types import SimpleNamespace
+import base64
+import hashlib
+import json
+import time
 
 security = HTTPBearer()
 
+# Verified tokens are cached for at most this long (and never past their expiry)
+AUTH_CACHE_MAX_TTL = 300
+
+def _auth_cache_key(token: str) -> str:
+    return f"auth:{hashlib.sha256(token.encode()).hexdigest()}"
+
+def _token_ttl(token: str) -> int:
+    """
+    Seconds left before the JWT expires, capped at AUTH_CACHE_MAX_TTL.
+    The signature isn't checked here; Supabase Auth already verified the token.
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload))["exp"]
+        return max(0, min(AUTH_CACHE_MAX_TTL, int(exp - time.time())))
+    except Exception:
+        return 0
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
-    Validates the JWT token using Supabase Auth and returns the user object.
+    Validates the JWT token using Supabase Auth and returns the user (id, email, role).
+    Verified tokens are cached in Redis, when available, to skip the Auth round-trip.
     """
     token = credentials.credentials
+    redis = get_redis_client()
+    key = _auth_cache_key(token)
+
+    if redis:
+        try:
+            cached = await redis.get(key)
+            if cached:
+                return SimpleNamespace(**json.loads(cached))
+        except Exception:
+            pass # Fall through to Supabase Auth
+
     client = get_supabase_client()
-    
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Supabase client not initialized"
-        )
-        
+
     try:
         # Verify the token and get the user
-        user = client.auth.get_user(token)
+        user = await sb(client.auth.get_user, token)
         if not user or not user.user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return user.user
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Could not validate credentials: {str(e)}",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    current = {"id": user.user.id, "email": user.user.email, "role": user.user.role}
+    ttl = _token_ttl(token)
+    if redis and ttl > 0:
+        try:
+            await redis.setex(key, ttl, json.dumps(current))
+        except Exception:
+            pass
+    return SimpleNamespace(**current)
@@ -1,39 +1,65 @@
 from fastapi import HTTPException, Request, Depends
 from core.config import get_redis_client
-import time
+from core.deps import get_current_user
+
+# Fixed window counter in one round-trip: increment, start the window on the
+# first hit, and return the TTL only when the limit has been exceeded.
+RATE_LIMIT_LUA = """
+local c = redis.call('INCR', KEYS[1])
+if c == 1 then redis.call('EXPIRE', KEYS[1], ARGV[2]) end
+if c > tonumber(ARGV[1]) then return {c, redis.call('TTL', KEYS[1])} end
+return {c, -1}
+"""
+
+_scripts = {}
+
+def _rate_limit_script(redis):
+    script = _scripts.get(id(redis))
+    if script is None:
+        script = _scripts[id(redis)] = redis.register_script(RATE_LIMIT_LUA)
+    return script
+
+async def _check_rate_limit(request: Request, identity: str, times: int, seconds: int):
+    redis = get_redis_client()
+    if not redis:
+        return # Skip if redis not available
+
+    key = f"rate_limit:{request.url.path}:{identity}"
+
+    try:
+        _, ttl = await _rate_limit_script(redis)(keys=[key], args=[times, seconds])
+    except Exception:
+        return # Don't block requests if Redis misbehaves
+
+    if ttl >= 0:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests. Try again in {ttl} seconds."
+        )
 
 class RateLimiter:
+    """
+    Per-user limit for authenticated routes. get_current_user is cached per
+    request by FastAPI, so the route's own user dependency doesn't run twice.
+    """
     def __init__(self, times: int = 10, seconds: int = 60):
         self.times = times
         self.seconds = seconds
 
-    async def __call__(self, request: Request, user: dict = Depends(lambda: {})):
-        redis = get_redis_client()
-        if not redis:
-            return # Skip if redis not available
-
+    async def __call__(self, request: Request, user = Depends(get_current_user)):
         # Identify user by ID if authenticated, else by IP
-        user_id = user.get("id")
-        if not user_id:
-             user_id = request.client.host
-        
-        key = f"rate_limit:{request.url.path}:{user_id}"
-        
-        # Redis logic: increment counter, set expiry if new
-        # Using a sliding window or fixed window. Fixed window is simpler.
-        
-        try:
-            current = await redis.get(key)
-            if current and int(current) >= self.times:
-                ttl = await redis.ttl(key)
-                raise HTTPException(
-                    status_code=429, 
-                    detail=f"Too many requests. Try again in {ttl} seconds."
-                )
-            pipe = redis.pipeline()
-            pipe.incr(key, 1)
-            if not current:
-                pipe.expire(key, self.seconds)
-            await pipe.execute()
-        except Exception:
+        user_id = getattr(user, "id", None) or request.client.host
+        await _check_rate_limit(request, user_id, self.times, self.seconds)
+
+class AnonRateLimiter:
+    """
+    Per-IP limit for routes that don't require authentication. times=0 turns it off.
+    """
+    def __init__(self, times: int = 10, seconds: int = 60):
+        self.times = times
+        self.seconds = seconds
+
+    async def __call__(self, request: Request):
+        if self.times <= 0:
             return
+        await _check_rate_limit(request, request.client.host, self.times, self.seconds)
@@ -0,0 +1,11 @@
+from typing import Any
+from fastapi.responses import JSONResponse
+import orjson
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson. Also accepts numpy scalars and non-string
+    keys, which the pandas aggregations can produce.
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
@@ -0,0 +1,38 @@
+from typing import Awaitable, Callable, TypeVar
+import logging
+import httpx
+import orjson
+
+T = TypeVar("T")
+
+# PostgREST error code for "function not found in the schema cache"
+MISSING_FUNCTION_CODE = "PGRST202"
+
+# SQL functions (backend/sql/) found to be missing, per process
+_missing_functions = set()
+
+def _error_code(exc: Exception):
+    # supabase-py raises postgrest APIError (.code); AsyncSupabase raises httpx.HTTPStatusError
+    code = getattr(exc, "code", None)
+    if code is None and isinstance(exc, httpx.HTTPStatusError):
+        try:
+            code = orjson.loads(exc.response.content).get("code")
+        except Exception:
+            return None
+    return code
+
+async def rpc_or_fallback(fn: str, rpc: Callable[[], Awaitable[T]], fallback: Callable[[], Awaitable[T]]) -> T:
+    """
+    Runs rpc() unless the SQL function `fn` is known to be missing. Only a
+    "function not found" error switches this process to fallback(); any other
+    RPC error is raised as usual.
+    """
+    if fn not in _missing_functions:
+        try:
+            return await rpc()
+        except Exception as e:
+            if _error_code(e) != MISSING_FUNCTION_CODE:
+                raise
+            _missing_functions.add(fn)
+            logging.warning(f"SQL function {fn} is not installed (see backend/sql/{fn}.sql), using the slower fallback")
+    return await fallback()
@@ -0,0 +1,145 @@
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+import orjson
+
+# Keep-alive HTTP/2 pool for PostgREST reads made from request handlers
+ASYNC_HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=50, keepalive_expiry=30)
+ASYNC_HTTP_TIMEOUT = 30
+
+def _quote(v: Any) -> str:
+    s = str(v).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{s}"'
+
+def _value(v: Any) -> str:
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    return str(v)
+
+class AsyncQuery:
+    """
+    Small async subset of the supabase-py query builder. Only the filters the
+    routes use are implemented; results have the same .data/.count shape.
+    """
+    def __init__(self, http: httpx.AsyncClient, table: str):
+        self._http = http
+        self._table = table
+        self._params: List[Tuple[str, str]] = []
+        self._headers: Dict[str, str] = {}
+        self._single = False
+        self._head = False
+
+    def select(self, columns: str = "*", count: Optional[str] = None, head: bool = False):
+        self._params.append(("select", columns))
+        if count:
+            self._headers["Prefer"] = f"count={count}"
+        self._head = head
+        return self
+
+    def _filter(self, column: str, op: str, value: str):
+        self._params.append((column, f"{op}.{value}"))
+        return self
+
+    def eq(self, column: str, value: Any):
+        return self._filter(column, "eq", _value(value))
+
+    def neq(self, column: str, value: Any):
+        return self._filter(column, "neq", _value(value))
+
+    def gt(self, column: str, value: Any):
+        return self._filter(column, "gt", _value(value))
+
+    def gte(self, column: str, value: Any):
+        return self._filter(column, "gte", _value(value))
+
+    def lt(self, column: str, value: Any):
+        return self._filter(column, "lt", _value(value))
+
+    def lte(self, column: str, value: Any):
+        return self._filter(column, "lte", _value(value))
+
+    def ilike(self, column: str, pattern: str):
+        return self._filter(column, "ilike", pattern)
+
+    def in_(self, column: str, values: List[Any]):
+        return self._filter(column, "in", "(" + ",".join(_quote(v) for v in values) + ")")
+
+    def cs(self, column: str, values: List[Any]):
+        return self._filter(column, "cs", "{" + ",".join(_quote(v) for v in values) + "}")
+
+    def ov(self, column: str, values: List[Any]):
+        return self._filter(column, "ov", "{" + ",".join(_quote(v) for v in values) + "}")
+
+    def or_(self, filters: str):
+        self._params.append(("or", f"({filters})"))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        term = f"{column}.{'desc' if desc else 'asc'}"
+        # PostgREST takes a single order parameter with comma-separated terms
+        for i, (k, v) in enumerate(self._params):
+            if k == "order":
+                self._params[i] = ("order", f"{v},{term}")
+                return self
+        self._params.append(("order", term))
+        return self
+
+    def limit(self, n: int):
+        self._params.append(("limit", str(n)))
+        return self
+
+    def range(self, start: int, end: int):
+        self._params.append(("offset", str(start)))
+        self._params.append(("limit", str(end - start + 1)))
+        return self
+
+    def single(self):
+        self._single = True
+        self._headers["Accept"] = "application/vnd.pgrst.object+json"
+        return self
+
+    async def execute(self):
+        method = "HEAD" if self._head else "GET"
+        resp = await self._http.request(method, f"/{self._table}", params=self._params, headers=self._headers)
+        resp.raise_for_status()
+        count = None
+        content_range = resp.headers.get("content-range", "")
+        if "/" in content_range and not content_range.endswith("/*"):
+            count = int(content_range.rsplit("/", 1)[1])
+        # orjson parses the raw bytes directly (httpx's .json() decodes to str and uses stdlib json)
+        return SimpleNamespace(data=[] if self._head else orjson.loads(resp.content), count=count)
+
+class AsyncRpc:
+    def __init__(self, http: httpx.AsyncClient, fn: str, params: Dict[str, Any]):
+        self._http = http
+        self._fn = fn
+        self._params = params
+
+    async def execute(self):
+        resp = await self._http.post(f"/rpc/{self._fn}", json=self._params)
+        resp.raise_for_status()
+        return SimpleNamespace(data=orjson.loads(resp.content), count=None)
+
+class AsyncSupabase:
+    """
+    Async PostgREST client on a pooled httpx.AsyncClient, for reads in request
+    handlers (the supabase-py client is synchronous and blocks the event loop).
+    Writes, auth and background jobs still use the supabase-py client.
+    """
+    def __init__(self, url: str, key: str):
+        self._http = httpx.AsyncClient(
+            base_url=f"{url}/rest/v1",
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            limits=ASYNC_HTTP_LIMITS,
+            timeout=ASYNC_HTTP_TIMEOUT,
+            http2=True,
+        )
+
+    def table(self, name: str) -> AsyncQuery:
+        return AsyncQuery(self._http, name)
+
+    def rpc(self, fn: str, params: Dict[str, Any]) -> AsyncRpc:
+        return AsyncRpc(self._http, fn, params)
+
+    async def aclose(self):
+        await self._http.aclose()
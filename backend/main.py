@@ -1,22 +1,25 @@
 from fastapi import FastAPI
+from core.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
-from core.config import startup_initialize
+from core.config import startup_initialize, shutdown_cleanup, CORS_ORIGINS
 from api.routes.upload import router as upload_router
 from api.routes.ai import router as ai_router
 from api.routes.transactions import router as transactions_router
 from api.routes.auth import router as auth_router
 from api.routes.categories import router as categories_router
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
+    allow_origins=CORS_ORIGINS,
+    # Auth is a bearer header, not cookies, so credentialed requests aren't needed
+    # (and browsers reject credentials with a wildcard origin anyway)
+    allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
 )
@@ -40,3 +43,7 @@ app.include_router(categories_router)
 @app.on_event("startup")
 async def startup_event():
     await startup_initialize()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await shutdown_cleanup()
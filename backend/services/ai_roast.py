@@ -1,29 +1,37 @@
-import os
 import logging
-from google.genai import Client
+import threading
+from cachetools import LRUCache
 
-def generate_roast_message(category: str, spent: float, limit: float, user_details: dict = None) -> str:
+def _bucket(amount: float) -> float:
     """
-    Generates a witty, sarcastic roast for exceeding the budget.
+    Rounds to two significant figures (512.3 -> 510, 12345 -> 12000), so repeat
+    overruns of about the same size reuse a cached roast instead of calling Gemini.
     """
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        return "You've exceeded your budget. Try to spend less next time!"
+    return float(f"{amount:.2g}")
 
-    try:
-        client = Client(api_key=api_key)
-        # Switching to stable model to avoid RESOURCE_EXHAUSTED errors on experimental models
-        model_name = "gemini-2.5-flash-lite" 
-    except Exception as e:
-        logging.error(f"Failed to initialize Gemini client for roast: {e}")
-        return "You've exceeded your budget. Try to spend less next time!"
+# Roasts keyed on (category, bucketed spent, bucketed limit, name, age)
+_ROAST_CACHE: LRUCache = LRUCache(maxsize=256)
+_ROAST_CACHE_LOCK = threading.Lock()
+
+def _roast_key(category: str, spent: float, limit: float, name: str = None, age: int = None):
+    spent_bucket, limit_bucket = _bucket(spent), _bucket(limit)
+    if spent_bucket <= limit_bucket:
+        # Barely over; rounding would hide the overrun
+        spent_bucket = float(round(spent))
+    return category, spent_bucket, limit_bucket, name, age
+
+def _ask_gemini_for_roast(category: str, spent: float, limit: float, name: str = None, age: int = None) -> str:
+    """
+    Asks Gemini for the roast, quoting the exact amounts. Raises on API errors.
+    """
+    # Deferred so importing this module doesn't set up the Gemini/LangGraph agent
+    from services.ai_service import get_gemini_client, GEMINI_MODEL
 
     name_context = ""
-    if user_details:
-        if user_details.get("name"):
-            name_context += f"The user's name is {user_details.get('name')}."
-        if user_details.get("age"):
-            name_context += f" The user is {user_details.get('age')} years old."
+    if name:
+        name_context += f"The user's name is {name}."
+    if age:
+        name_context += f" The user is {age} years old."
     
     prompt = f"""
     You are a witty, sarcastic, and slightly mean financial advisor. 
@@ -36,13 +44,38 @@ def generate_roast_message(category: str, spent: float, limit: float, user_detai
     Use Indian currency symbol (₹). Make it memorable, funny, and stinging but not offensive.
     """
 
+    resp = get_gemini_client().models.generate_content(
+        # Switching to stable model to avoid RESOURCE_EXHAUSTED errors on experimental models
+        model=GEMINI_MODEL,
+        contents=prompt
+    )
+    return getattr(resp, "text", "").strip()
+
+def generate_roast_message(category: str, spent: float, limit: float, user_details: dict = None) -> str:
+    """
+    Generates a witty, sarcastic roast for exceeding the budget.
+    """
+    from services.ai_service import get_gemini_client
+    try:
+        client = get_gemini_client()
+    except Exception as e:
+        logging.error(f"Failed to initialize Gemini client for roast: {e}")
+        client = None
+    if not client:
+        return "You've exceeded your budget. Try to spend less next time!"
+
+    user_details = user_details or {}
+    name, age = user_details.get("name"), user_details.get("age")
+    key = _roast_key(category, spent, limit, name, age)
+    with _ROAST_CACHE_LOCK:
+        roast = _ROAST_CACHE.get(key)
+    if roast is not None:
+        return roast
     try:
-        resp = client.models.generate_content(
-            model=model_name,
-            contents=prompt
-        )
-        return getattr(resp, "text", "").strip()
+        roast = _ask_gemini_for_roast(category, spent, limit, name, age)
+        with _ROAST_CACHE_LOCK:
+            _ROAST_CACHE[key] = roast
+        return roast
     except Exception as e:
         logging.error(f"Gemini API call failed for roast: {e}")
         return "You've exceeded your budget. Serious financial discipline is required!"
-    return getattr(resp, "text", "")
@@ -1,11 +1,22 @@
 import os
+import re
 import json
-from typing import List, Dict, Any, TypedDict
+import asyncio
+import threading
+import itertools
+import orjson
+from collections import defaultdict
+from cachetools import TTLCache
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple, TypedDict
+import pandas as pd
 from google.genai import Client
 from google.genai.types import GenerateContentConfig
 from langgraph.graph import StateGraph, END
+from fastapi import BackgroundTasks
+from pydantic import BaseModel, TypeAdapter, ValidationError
 import logging
-from services.budget_monitor import check_budget_and_notify
+from services.budget_monitor import check_budgets_bulk
+from core.config import sb
 
 class State(TypedDict):
     supabase: Any
@@ -18,6 +29,16 @@ class State(TypedDict):
     insights: str
     user_profile: Dict[str, Any]
     categories: List[str]
+    all_high: bool
+
+class TxTag(BaseModel):
+    id: int
+    category: str
+    tags: List[str]
+    confidence: float
+    requires_human_verification: bool
+
+_TAG_ADAPTER = TypeAdapter(List[TxTag])
 
 DEFAULT_CATEGORIES = [
     "Groceries",
@@ -76,29 +97,118 @@ TAG_HEURISTICS = {
     "CreditRotation": "Using one card to pay off another or ATM cash withdrawal from a credit card."
 }
 
+GEMINI_MODEL = "gemini-2.5-flash-lite"
+
+_GEMINI_CLIENT: Optional[Client] = None
+_GEMINI_CLIENT_LOCK = threading.Lock()
+
+_GENERATE_CONFIGS = {
+    "application/json": GenerateContentConfig(response_mime_type="application/json"),
+    "text/plain": GenerateContentConfig(response_mime_type="text/plain"),
+}
+
+def get_gemini_client() -> Optional[Client]:
+    """
+    Returns the process-wide Gemini client, creating it on first use.
+    The async API is available as `get_gemini_client().aio`.
+    """
+    global _GEMINI_CLIENT
+    if _GEMINI_CLIENT:
+        return _GEMINI_CLIENT
+    with _GEMINI_CLIENT_LOCK:
+        if not _GEMINI_CLIENT:
+            api_key = os.environ.get("GEMINI_API_KEY")
+            if not api_key:
+                logging.error("GEMINI_API_KEY not found in environment variables")
+                return None
+            _GEMINI_CLIENT = Client(api_key=api_key)
+    return _GEMINI_CLIENT
+
+# Tagging output is constrained server-side to a list of TxTag, so the prompt
+# doesn't need to describe the output format.
+_TAGGING_CONFIG = GenerateContentConfig(response_mime_type="application/json", response_schema=list[TxTag])
+
+def _generate_config(response_mime_type: str) -> GenerateContentConfig:
+    return _GENERATE_CONFIGS.get(response_mime_type) or GenerateContentConfig(response_mime_type=response_mime_type)
+
+# Verified history is read and aggregated this many rows at a time for insights
+VERIFIED_PAGE_SIZE = 1000
+
+# Transactions are tagged in prompt groups of this size, with at most
+# GEMINI_CONCURRENCY requests in flight at once.
+PROMPT_GROUP_SIZE = int(os.environ.get("GEMINI_PROMPT_GROUP_SIZE", 15))
+GEMINI_CONCURRENCY = 8
+
 FEW_SHOT_EXAMPLES = [
     {
         "input": {"date": "01Nov,2025","transaction_details": "PaidtoBlinkit","transaction_type": "Debit","amount": 425.0,"statement_type": "UPI"},
-        "output": {"category": "Groceries","tags": ["essential","recurring"],"confidence": 0.93,"requires_human_verification": False,"reasoning": "Grocery purchase via UPI."}
+        "output": {"category": "Groceries","tags": ["essential","recurring"],"confidence": 0.93,"requires_human_verification": False}
     },
     {
         "input": {"date": "18-10-2025","transaction_details": "POS/NETFLIX/MUMBAI/181025/08:41/481907","transaction_type": "Debit","amount": 649.0,"statement_type": "Bank"},
-        "output": {"category": "Subscriptions","tags": ["subscription","recurring"],"confidence": 0.98,"requires_human_verification": False,"reasoning": "Recurring OTT subscription."}
+        "output": {"category": "Subscriptions","tags": ["subscription","recurring"],"confidence": 0.98,"requires_human_verification": False}
     },
     {
         "input": {"date": "03Nov,2025","transaction_details": "PaidtoUttarGujaratVij(UGVCL)","transaction_type": "Debit","amount": 5873.22,"statement_type": "UPI"},
-        "output": {"category": "Utilities","tags": ["essential","recurring"],"confidence": 0.96,"requires_human_verification": False,"reasoning": "Electricity bill."}
+        "output": {"category": "Utilities","tags": ["essential","recurring"],"confidence": 0.96,"requires_human_verification": False}
     },
     {
         "input": {"date": "29-10-2025","transaction_details": "NEFT/CITIN25645632712/CAPITAL ONE SERVICES (I) PVT/CITI BANK/","transaction_type": "Credit","amount": 165611.0,"statement_type": "Bank"},
-        "output": {"category": "Income","tags": ["work","recurring"],"confidence": 0.98,"requires_human_verification": False,"reasoning": "Salary credit via NEFT."}
+        "output": {"category": "Income","tags": ["work","recurring"],"confidence": 0.98,"requires_human_verification": False}
     },
     {
         "input": {"date": "27-09-2025","transaction_details": "IMPS Chrgs Incl GST","transaction_type": "Debit","amount": 5.9,"statement_type": "Bank"},
-        "output": {"category": "Fees","tags": ["one-off"],"confidence": 0.88,"requires_human_verification": False,"reasoning": "Bank fee."}
+        "output": {"category": "Fees","tags": ["one-off"],"confidence": 0.88,"requires_human_verification": False}
     }
 ]
 
+# Merchants that always land in the same bucket. Matching rows are tagged here
+# and never sent to Gemini. A rule only applies if its category is one of the
+# user's categories (and, when given, the transaction type matches).
+_RULES: List[Tuple[re.Pattern, Optional[str], Dict[str, Any]]] = [
+    (re.compile(r"NETFLIX|SPOTIFY|HOTSTAR|PRIMEVIDEO|PRIME VIDEO|YOUTUBE ?PREMIUM", re.I), "Debit",
+     {"category": "Subscriptions", "tags": ["subscription", "recurring"]}),
+    (re.compile(r"BLINKIT|ZEPTO|BIG ?BASKET|INSTAMART", re.I), "Debit",
+     {"category": "Groceries", "tags": ["essential", "recurring"]}),
+    (re.compile(r"UGVCL|MGVCL|PGVCL|DGVCL|TORRENT ?POWER|BESCOM|TATA ?POWER", re.I), "Debit",
+     {"category": "Utilities", "tags": ["essential", "recurring"]}),
+    (re.compile(r"SALARY", re.I), "Credit",
+     {"category": "Income", "tags": ["work", "recurring"]}),
+    (re.compile(r"(IMPS|NEFT|RTGS|SMS) ?CHRGS|CHARGES INCL GST", re.I), "Debit",
+     {"category": "Fees", "tags": ["one-off"]}),
+]
+RULE_CONFIDENCE = 0.99
+
+def match_rule(t: Dict[str, Any], categories: List[str]) -> Optional[TxTag]:
+    details = t.get("transaction_details") or ""
+    for pattern, tx_type, out in _RULES:
+        if tx_type and t.get("transaction_type") != tx_type:
+            continue
+        if out["category"] in categories and pattern.search(details):
+            return TxTag(id=t["id"], confidence=RULE_CONFIDENCE, requires_human_verification=False, **out)
+    return None
+
+# Per-user category rows ({"name", "max_budget"}). Categories rarely change, so
+# agent runs skip the SELECT; the /categories write routes invalidate entries.
+# The cache is per process (other API workers and the arq worker keep their own
+# copy until it expires), so budgets are always read from the table instead.
+_CATEGORY_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=300)
+_CATEGORY_CACHE_LOCK = threading.Lock()
+
+def get_user_categories(client: Any, user_id: str) -> List[Dict[str, Any]]:
+    with _CATEGORY_CACHE_LOCK:
+        cats = _CATEGORY_CACHE.get(user_id)
+    if cats is None:
+        res = client.table("categories").select("name, max_budget").eq("user_id", user_id).execute()
+        cats = res.data or []
+        with _CATEGORY_CACHE_LOCK:
+            _CATEGORY_CACHE[user_id] = cats
+    return cats
+
+def invalidate_categories_cache(user_id: str) -> None:
+    with _CATEGORY_CACHE_LOCK:
+        _CATEGORY_CACHE.pop(user_id, None)
+
 def fetch_unverified(state: State) -> State:
     s = state["supabase"]
     limit = state["batch_size"]
@@ -106,22 +216,15 @@ def fetch_unverified(state: State) -> State:
     
     # Fetch categories
     try:
-        if user_id:
-            res = s.table("categories").select("name").eq("user_id", user_id).execute()
-            cats = [r["name"] for r in res.data] if res.data else []
-            if not cats:
-                 state["categories"] = DEFAULT_CATEGORIES
-            else:
-                 state["categories"] = cats
-        else:
-            state["categories"] = DEFAULT_CATEGORIES
+        cats = [c["name"] for c in get_user_categories(s, user_id)] if user_id else []
+        state["categories"] = cats or DEFAULT_CATEGORIES
     except Exception as e:
         logging.error(f"Failed to fetch categories: {e}")
         state["categories"] = DEFAULT_CATEGORIES
 
     logging.info(f"Fetching unverified transactions for user_id={user_id}, limit={limit}")
     
-    query = s.table("transactions").select("id,date,transaction_details,transaction_type,amount,statement_type,verification_status").eq("verification_status", "unverified")
+    query = s.table("transactions").select("id,date,transaction_details,transaction_type,amount,statement_type").eq("verification_status", "unverified")
     
     if user_id:
         query = query.eq("user_id", user_id)
@@ -132,28 +235,32 @@ def fetch_unverified(state: State) -> State:
     state["transactions"] = data or []
     return state
 
-def build_prompt(transactions: List[Dict[str, Any]], categories: List[str] = DEFAULT_CATEGORIES) -> str:
-    instr = {
-        "task": "Categorize and tag transactions. Return JSON array.",
-        "categories": categories,
-        "tags": TAGS,
-        "apply_heuristics_first": True,
-        "tag_heuristics": TAG_HEURISTICS,
-        "rules": {
-            "output_schema": {
-                "id": "int",
-                "category": "str",
-                "tags": "list[str]",
-                "confidence": "float[0,1]",
-                "requires_human_verification": "bool"
-            },
-            "confidence_definition": {
-                "high": ">= 0.85",
-                "doubtful": "< 0.85"
-            }
-        },
-        "few_shot_examples": FEW_SHOT_EXAMPLES,
-        "inputs": [
+# Static part of every tagging prompt. Serialized once at import and sent as
+# the first part of the request so the prefix is identical across calls.
+_PREAMBLE_JSON = orjson.dumps({
+    "task": "Categorize and tag transactions. Return a JSON array with exactly one object per input, in the same order as inputs.",
+    "tags": TAGS,
+    "apply_heuristics_first": True,
+    "tag_heuristics": TAG_HEURISTICS,
+    "rules": {
+        "confidence_definition": {
+            "high": ">= 0.85",
+            "doubtful": "< 0.85"
+        }
+    },
+    "few_shot_examples": FEW_SHOT_EXAMPLES
+}).decode()
+
+def build_prompts(transactions: List[Dict[str, Any]], categories: List[str] = DEFAULT_CATEGORIES, group_size: int = PROMPT_GROUP_SIZE) -> List[str]:
+    """
+    Splits transactions into groups of `group_size` and builds the per-group
+    part of the prompt (categories + inputs). The static instructions live in
+    _PREAMBLE_JSON and are prepended by call_gemini.
+    """
+    prefix = '{"categories":' + orjson.dumps(categories).decode() + ',"inputs":'
+    prompts = []
+    for i in range(0, len(transactions), group_size):
+        inputs = [
             {
                 "id": t.get("id"),
                 "date": t.get("date"),
@@ -161,30 +268,49 @@ def build_prompt(transactions: List[Dict[str, Any]], categories: List[str] = DEF
                 "transaction_type": t.get("transaction_type"),
                 "amount": t.get("amount"),
                 "statement_type": t.get("statement_type")
-            } for t in transactions
+            } for t in transactions[i:i + group_size]
         ]
-    }
-    return json.dumps(instr)
-
-def call_gemini(prompt: str, response_mime_type: str = "application/json") -> Any:
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        logging.error("GEMINI_API_KEY not found in environment variables")
+        prompts.append(prefix + orjson.dumps(inputs).decode() + "}")
+    return prompts
+
+def _build_contents(prompt: str, preamble: str = None) -> Any:
+    if not preamble:
+        return prompt
+    return [{"role": "user", "parts": [{"text": preamble}, {"text": prompt}]}]
+
+def parse_json_output(text: str) -> Any:
+    """
+    Parses a JSON model response. If the model wrapped the array in extra text
+    (markdown fences, trailing comments), the outermost [...] span is retried.
+    """
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError as e:
+        start, end = text.find("["), text.rfind("]")
+        if start != -1 and end > start:
+            try:
+                return orjson.loads(text[start:end + 1])
+            except orjson.JSONDecodeError:
+                pass
+        logging.error(f"Failed to parse JSON response: {e}")
         return []
-        
+
+def call_gemini(prompt: str, response_mime_type: str = "application/json", preamble: str = None, config: GenerateContentConfig = None) -> Any:
     try:
-        client = Client(api_key=api_key)
-        model_name = "gemini-2.5-flash-lite"
+        client = get_gemini_client()
+        model_name = GEMINI_MODEL
     except Exception as e:
         logging.error(f"Failed to initialize Gemini client: {e}")
-        return []
+        client = None
+    if not client:
+        return [] if response_mime_type == "application/json" else ""
 
     try:
-        config = GenerateContentConfig(response_mime_type=response_mime_type)
+        config = config or _generate_config(response_mime_type)
         logging.info(f"Calling Gemini with model {model_name}, mime_type={response_mime_type}")
         resp = client.models.generate_content(
             model=model_name,
-            contents=prompt,
+            contents=_build_contents(prompt, preamble),
             config=config
         )
     except Exception as e:
@@ -192,168 +318,255 @@ def call_gemini(prompt: str, response_mime_type: str = "application/json") -> An
         return [] if response_mime_type == "application/json" else ""
 
     if response_mime_type == "application/json":
-        try:
-            return json.loads(getattr(resp, "text", "") or "[]")
-        except Exception as e:
-            logging.error(f"Failed to parse JSON response: {e}")
-            return []
+        return parse_json_output(getattr(resp, "text", "") or "[]")
     
     return getattr(resp, "text", "")
 
+async def call_gemini_async(prompt: str, response_mime_type: str = "application/json", preamble: str = None, config: GenerateContentConfig = None) -> Any:
+    try:
+        client = get_gemini_client()
+        model_name = GEMINI_MODEL
+    except Exception as e:
+        logging.error(f"Failed to initialize Gemini client: {e}")
+        client = None
+    if not client:
+        return [] if response_mime_type == "application/json" else ""
 
+    try:
+        config = config or _generate_config(response_mime_type)
+        logging.info(f"Calling Gemini (async) with model {model_name}, mime_type={response_mime_type}")
+        resp = await client.aio.models.generate_content(
+            model=model_name,
+            contents=_build_contents(prompt, preamble),
+            config=config
+        )
+    except Exception as e:
+        logging.error(f"Gemini API call failed: {e}")
+        return [] if response_mime_type == "application/json" else ""
+
+    if response_mime_type == "application/json":
+        return parse_json_output(getattr(resp, "text", "") or "[]")
+
+    return getattr(resp, "text", "")
+
+def validate_tags(out: Any) -> List[TxTag]:
+    """
+    Validates a parsed Gemini response in one pass. If the batch as a whole is
+    invalid, rows are validated one by one and the bad ones are dropped, so the
+    matching transactions fall back to human verification.
+    """
+    if not isinstance(out, list):
+        return []
+    try:
+        return _TAG_ADAPTER.validate_python(out)
+    except ValidationError:
+        rows = []
+        for o in out:
+            try:
+                rows.append(TxTag.model_validate(o))
+            except ValidationError:
+                continue
+        return rows
+
+def _merge_row(t: Dict[str, Any], r: Optional[TxTag], threshold: float) -> Dict[str, Any]:
+    if r is None:
+        return {
+            "id": t.get("id"),
+            "date": t.get("date"),
+            "transaction_details": t.get("transaction_details"),
+            "amount": t.get("amount"),
+            "transaction_type": t.get("transaction_type"),
+            "category": "Other",
+            "tags": [],
+            "confidence": 0.0,
+            "verification_status": "required_human_verification",
+            "requires_human_verification": True
+        }
+    # Determine status
+    if r.confidence >= threshold and not r.requires_human_verification:
+        v_status = "ai_verified"
+    else:
+        v_status = "required_human_verification"
+
+    return {
+        "id": t.get("id"),
+        "date": t.get("date"),
+        "transaction_details": t.get("transaction_details"),
+        "amount": t.get("amount"),
+        "transaction_type": t.get("transaction_type"),
+        "category": r.category,
+        "tags": r.tags,
+        "confidence": r.confidence,
+        "verification_status": v_status,
+        "requires_human_verification": (v_status == "required_human_verification")
+    }
 
-def tag_with_gemini(state: State) -> State:
+async def tag_with_gemini(state: State) -> State:
     txs = state["transactions"]
     if not txs:
         logging.info("No transactions to tag")
         state["results"] = []
+        state["all_high"] = False
+        state["path"] = "B"
         return state
-    logging.info(f"Tagging {len(txs)} transactions with Gemini")
-    prompt = build_prompt(txs, state.get("categories", DEFAULT_CATEGORIES))
-    out = call_gemini(prompt)
-    results_map = {o.get("id"): o for o in out if isinstance(o, dict) and "id" in o}
-    merged: List[Dict[str, Any]] = []
-    for t in txs:
-        rid = t.get("id")
-        o = results_map.get(rid, None)
-        if not o:
-            merged.append({
-                "id": rid,
-                "date": t.get("date"),
-                "transaction_details": t.get("transaction_details"),
-                "amount": t.get("amount"),
-                "transaction_type": t.get("transaction_type"),
-                "category": "Other",
-                "tags": [],
-                "confidence": 0.0,
-                "verification_status": "required_human_verification",
-                "requires_human_verification": True
-            })
+    threshold = state["threshold"]
+    categories = state.get("categories", DEFAULT_CATEGORIES)
+
+    # Rule pass: deterministic merchants are settled without a Gemini call.
+    merged: List[Dict[str, Any]] = [None] * len(txs)
+    residual_idx: List[int] = []
+    for i, t in enumerate(txs):
+        r = match_rule(t, categories)
+        if r is None:
+            residual_idx.append(i)
         else:
-            c = float(o.get("confidence", 0.0))
-            bt = o.get("behavioral_tags", o.get("tags", []))
-            # Determine status
-            req_human = bool(o.get("requires_human_verification", False))
-            if c >= state["threshold"] and not req_human:
-                v_status = "ai_verified"
-            else:
-                v_status = "required_human_verification"
-            
-            merged.append({
-                "id": rid,
-                "date": t.get("date"),
-                "transaction_details": t.get("transaction_details"),
-                "amount": t.get("amount"),
-                "transaction_type": t.get("transaction_type"),
-                "category": o.get("category", "Other"),
-                "tags": bt if isinstance(bt, list) else [],
-                "confidence": c,
-                "verification_status": v_status,
-                "requires_human_verification": (v_status == "required_human_verification")
-            })
-            
+            merged[i] = _merge_row(t, r, threshold)
+    residual = [txs[i] for i in residual_idx]
+
+    prompts = build_prompts(residual, categories, PROMPT_GROUP_SIZE)
+    logging.info(f"Tagging {len(txs)} transactions: {len(txs) - len(residual)} by rules, {len(residual)} with Gemini in {len(prompts)} batches")
+
+    sem = asyncio.Semaphore(GEMINI_CONCURRENCY)
+
+    async def sem_call(prompt: str) -> Any:
+        async with sem:
+            return await call_gemini_async(prompt, preamble=_PREAMBLE_JSON, config=_TAGGING_CONFIG)
+
+    outs = await asyncio.gather(*[sem_call(p) for p in prompts])
+
+    # The model is asked to answer in input order, so each group's output is
+    # matched to its inputs by position. A row whose id doesn't line up falls
+    # back to an id lookup within that group.
+    for g, out in enumerate(outs):
+        start = g * PROMPT_GROUP_SIZE
+        group = residual[start:start + PROMPT_GROUP_SIZE]
+        out = validate_tags(out)
+        by_id = None
+        for i, (t, r) in enumerate(itertools.zip_longest(group, out[:len(group)])):
+            if r is None or r.id != t.get("id"):
+                if by_id is None:
+                    by_id = {r.id: r for r in out}
+                r = by_id.get(t.get("id"))
+            merged[residual_idx[start + i]] = _merge_row(t, r, threshold)
+
+    all_high = all(row["verification_status"] == "ai_verified" for row in merged)
     state["results"] = merged
+    # Routing is decided here so router() doesn't rescan the results. `path` is
+    # also set here because state changes made inside a router are discarded.
+    state["all_high"] = all_high and bool(merged)
+    state["path"] = "A" if state["all_high"] else "B"
     return state
 
-def generate_insights(state: State) -> State:
-    # 1. Fetch User Profile
-    user_id = state.get("user_id")
-    if not user_id:
-        # Fallback to fetching from first transaction if not provided in state (legacy support)
-        if not state["transactions"]:
-            return state
-        user_id = state["transactions"][0].get("user_id")
-        if not user_id:
-            try:
-                 first_id = state["transactions"][0].get("id")
-                 res = state["supabase"].table("transactions").select("user_id").eq("id", first_id).single().execute()
-                 if res.data:
-                     user_id = res.data.get("user_id")
-            except:
-                 pass
-        if not user_id:
-            return state
-
-    client = state["supabase"]
-    
-    # Fetch user profile
-    try:
-        user_res = client.table("users").select("age, yearly_income, country").eq("id", user_id).single().execute()
+def _pivot_by_type(df: pd.DataFrame, index: str) -> Dict[str, Dict[str, float]]:
+    if df.empty:
+        return {}
+    pivot = df.pivot_table(index=index, columns="transaction_type", values="amount", aggfunc="sum", fill_value=0.0)
+    return pivot.reindex(columns=["Credit", "Debit"], fill_value=0.0).astype(float).to_dict(orient="index")
+
+def aggregate_stats(rows: List[Dict[str, Any]]):
+    """
+    Sums amounts per category and per behavioral tag, split by transaction type.
+    Returns ({category: {"Credit": x, "Debit": y}}, {tag: {"Credit": x, "Debit": y}}).
+    """
+    df = pd.DataFrame(rows, columns=["amount", "transaction_type", "category", "tags"])
+    df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0)
+    df["transaction_type"] = df["transaction_type"].fillna("Debit")
+    df["category"] = df["category"].fillna("Other")
+
+    category_stats = _pivot_by_type(df, "category")
+
+    # astype(bool) keeps this a mask on empty frames, where map() returns an object Series
+    is_list = df["tags"].map(lambda t: isinstance(t, list)).astype(bool)
+    tagged = df.loc[is_list].explode("tags").dropna(subset=["tags"])
+    tag_stats = _pivot_by_type(tagged, "tags")
+    return category_stats, tag_stats
+
+def _zero_split() -> Dict[str, float]:
+    return {"Credit": 0.0, "Debit": 0.0}
+
+def fold_into(category_stats: Dict[str, Dict[str, float]], tag_stats: Dict[str, Dict[str, float]], rows: List[Dict[str, Any]]) -> None:
+    """
+    Aggregates one page of rows and adds it to running defaultdict(_zero_split) totals.
+    """
+    if not rows:
+        return
+    page_cats, page_tags = aggregate_stats(rows)
+    for totals, page in ((category_stats, page_cats), (tag_stats, page_tags)):
+        for key, split in page.items():
+            acc = totals[key]
+            acc["Credit"] += split["Credit"]
+            acc["Debit"] += split["Debit"]
+
+def aggregate_verified_history(client: Any, user_id: str, page_size: int = VERIFIED_PAGE_SIZE):
+    """
+    Pages through the user's verified transactions and folds each page into the
+    category/tag totals, so memory stays bounded by page_size.
+    Returns (category_stats, tag_stats, row_count).
+    """
+    category_stats = defaultdict(_zero_split)
+    tag_stats = defaultdict(_zero_split)
+    total = 0
+    offset = 0
+    while True:
+        res = client.table("transactions")\
+            .select("amount,transaction_type,category,tags")\
+            .eq("user_id", user_id)\
+            .in_("verification_status", ["ai_verified", "human_verified"])\
+            .order("id")\
+            .range(offset, offset + page_size - 1)\
+            .execute()
+        batch = res.data or []
+        fold_into(category_stats, tag_stats, batch)
+        total += len(batch)
+        if len(batch) < page_size:
+            break
+        offset += page_size
+    return category_stats, tag_stats, total
+
+NO_INSIGHTS_DATA_MESSAGE = "No verified financial data found. Please upload and verify bank statements first."
+
+async def fetch_insights_inputs(client: Any, user_id: str):
+    """
+    Fetches the user profile and category budgets while aggregating the verified
+    transaction history, all concurrently.
+    Returns (user_profile, category_budgets, category_stats, tag_stats, tx_count).
+    """
+    logging.info(f"Fetching profile, budgets and transactions for user_id={user_id}")
+    user_res, cat_res, history = await asyncio.gather(
+        sb(client.table("users").select("age, yearly_income, country").eq("id", user_id).single().execute),
+        sb(client.table("categories").select("name, max_budget").eq("user_id", user_id).execute),
+        sb(aggregate_verified_history, client, user_id),
+        return_exceptions=True
+    )
+
+    # User profile
+    user_profile = {}
+    if not isinstance(user_res, BaseException):
         user_profile = user_res.data if hasattr(user_res, "data") else {}
-    except:
-        user_profile = {}
-        
+
     if not user_profile:
         # Defaults if profile missing
         user_profile = {"age": 30, "yearly_income": 50000, "country": "Unknown"}
-    
-    state["user_profile"] = user_profile
-    
-    # Fetch Category Budgets
+
+    # Category budgets
     category_budgets = {}
-    try:
-        cat_res = client.table("categories").select("name, max_budget").eq("user_id", user_id).execute()
-        if cat_res.data:
-            for c in cat_res.data:
-                category_budgets[c["name"]] = {"max": c["max_budget"]}
-    except Exception as e:
-        logging.error(f"Failed to fetch category budgets for insights: {e}")
+    if isinstance(cat_res, BaseException):
+        logging.error(f"Failed to fetch category budgets for insights: {cat_res}")
+    else:
+        for c in cat_res.data or []:
+            category_budgets[c["name"]] = {"max": c["max_budget"]}
 
-    # 2. Aggregation Logic
-    # Fetch all verified transactions for this user
-    all_txs = []
-    try:
-        logging.info(f"Fetching transactions for user_id={user_id}")
-        all_tx_res = client.table("transactions")\
-            .select("amount, transaction_type, category, tags, date")\
-            .eq("user_id", user_id)\
-            .in_("verification_status", ["ai_verified", "human_verified"])\
-            .execute()
-        all_txs = all_tx_res.data if hasattr(all_tx_res, "data") else []
-        logging.info(f"Fetched {len(all_txs)} verified transactions")
-    except Exception as e:
-        logging.exception(f"Failed to fetch verified transactions for insights generation: {e}")
-    # Aggregation
-    if not all_txs:
-        logging.warning("No verified transactions found for insights")
-        state["insights"] = "No verified financial data found. Please upload and verify bank statements first."
-        return state
+    # Verified transactions
+    if isinstance(history, BaseException):
+        logging.error(f"Failed to fetch verified transactions for insights generation: {history}")
+        history = (defaultdict(_zero_split), defaultdict(_zero_split), 0)
+    category_stats, tag_stats, tx_count = history
+    logging.info(f"Aggregated {tx_count} verified transactions")
 
-    category_stats = {}
-    tag_stats = {}
-    
-    # Helper to aggregate
-    def update_agg(agg_dict, key, amount, type_):
-        if key not in agg_dict:
-            agg_dict[key] = {"Credit": 0.0, "Debit": 0.0}
-        agg_dict[key][type_] += amount
-
-    # Process DB transactions
-    for t in all_txs:
-        amt = t.get("amount", 0.0)
-        ttype = t.get("transaction_type", "Debit")
-        cat = t.get("category", "Other")
-        tags = t.get("tags", [])
-        
-        update_agg(category_stats, cat, amt, ttype)
-        if isinstance(tags, list):
-            for tag in tags:
-                update_agg(tag_stats, tag, amt, ttype)
-                
-    # Process current batch results (merged into results)
-    for r in state["results"]:
-        amt = r.get("amount", 0.0)
-        ttype = r.get("transaction_type", "Debit")
-        cat = r.get("category", "Other")
-        tags = r.get("tags", [])
-        
-        update_agg(category_stats, cat, amt, ttype)
-        if isinstance(tags, list):
-            for tag in tags:
-                update_agg(tag_stats, tag, amt, ttype)
+    return user_profile, category_budgets, category_stats, tag_stats, tx_count
 
-    # 3. Build Prompt for Insights
-    insight_prompt = f"""
+def build_insights_prompt(user_profile: Dict[str, Any], category_stats: Dict[str, Any], category_budgets: Dict[str, Any], tag_stats: Dict[str, Any]) -> str:
+    return f"""
 ### Persona
 You are an elite Financial Behavioral Analyst. Your goal is to analyze structured banking data (categorized monthly debits/credits, age, income, and location) to provide deep, actionable psychological and financial insights.
 
@@ -378,9 +591,31 @@ Please generate a report covering the following five areas:
 - Format: Use Markdown headers and bullet points. Avoid generic advice; use the specific numbers provided.
 """
 
+async def generate_insights(state: State) -> State:
+    # 1. Fetch User Profile (user_id comes from the authenticated caller)
+    user_id = state.get("user_id")
+    if not user_id:
+        logging.warning("generate_insights called without user_id")
+        state["insights"] = "Cannot generate insights: missing user_id."
+        return state
+
+    user_profile, category_budgets, category_stats, tag_stats, tx_count = await fetch_insights_inputs(state["supabase"], user_id)
+    state["user_profile"] = user_profile
+
+    # 2. Aggregation (history is already folded; add the current batch)
+    if not tx_count:
+        logging.warning("No verified transactions found for insights")
+        state["insights"] = NO_INSIGHTS_DATA_MESSAGE
+        return state
+
+    fold_into(category_stats, tag_stats, state["results"])
+
+    # 3. Build Prompt for Insights
+    insight_prompt = build_insights_prompt(user_profile, category_stats, category_budgets, tag_stats)
+
     # 4. Call Gemini for Insights
     logging.info("Generating insights with Gemini...")
-    insights = call_gemini(insight_prompt, response_mime_type="text/plain")
+    insights = await call_gemini_async(insight_prompt, response_mime_type="text/plain")
     
     if not insights:
         logging.warning("Gemini returned empty insights")
@@ -392,14 +627,7 @@ Please generate a report covering the following five areas:
     return state
 
 def router(state: State) -> str:
-    res = state["results"] or []
-    if not res:
-        state["path"] = "B"
-        return "mark_needs_verification"
-    th = state["threshold"]
-    all_high = all((r.get("confidence", 0.0) >= th) and (r.get("verification_status") == "ai_verified") for r in res)
-    state["path"] = "A" if all_high else "B"
-    return "behavioral_analysis" if state["path"] == "A" else "mark_needs_verification"
+    return "behavioral_analysis" if state.get("all_high") else "mark_needs_verification"
 
 def behavioral_analysis(state: State) -> State:
     return state
@@ -407,31 +635,45 @@ def behavioral_analysis(state: State) -> State:
 def mark_needs_verification(state: State) -> State:
     return state
 
-def persist_results(supabase, results: List[Dict[str, Any]], user_id: str = None, user_email: str = None) -> None:
+async def persist_results(supabase, results: List[Dict[str, Any]], user_id: str = None, user_email: str = None, background_tasks: Optional[BackgroundTasks] = None) -> None:
     if not supabase or not results:
         return
     logging.info(f"Persisting {len(results)} results to database")
+    # Only category, tags and verification_status change. Rows sharing those
+    # values are updated together with one UPDATE ... WHERE id IN (...).
+    groups: Dict[tuple, List[Any]] = defaultdict(list)
+    for r in results:
+        tags = r.get("tags") if isinstance(r.get("tags"), list) else []
+        vs = "ai_verified" if not bool(r.get("requires_human_verification")) else "required_human_verification"
+        groups[(r.get("category"), tuple(tags), vs)].append(r.get("id"))
+
+    keys = list(groups)
+    outcomes = await asyncio.gather(*[
+        sb(supabase.table("transactions").update({
+            "category": cat,
+            "tags": list(tags),
+            "verification_status": vs
+        }).in_("id", groups[(cat, tags, vs)]).execute)
+        for cat, tags, vs in keys
+    ], return_exceptions=True)
+
     updated_categories = set()
+    for (cat, _, _), outcome in zip(keys, outcomes):
+        if isinstance(outcome, Exception):
+            logging.error(f"Error persisting results for category {cat}: {outcome}")
+        elif cat and cat != "Uncategorized":
+            updated_categories.add(cat)
+
     try:
-        for r in results:
-            vs = "ai_verified" if not bool(r.get("requires_human_verification")) else "required_human_verification"
-            cat = r.get("category")
-            supabase.table("transactions").update({
-                "category": cat,
-                "tags": r.get("tags") if isinstance(r.get("tags"), list) else [],
-                "verification_status": vs
-            }).eq("id", r.get("id")).execute()
-            
-            if cat and cat != "Uncategorized":
-                updated_categories.add(cat)
-                
-        # Check budgets for updated categories
-        if user_id and user_email:
-            for category in updated_categories:
-                check_budget_and_notify(user_id, user_email, category)
-                
+        # Check budgets for updated categories. When called from a request handler the
+        # checks (and any alert emails) run after the response has been sent.
+        if user_id and user_email and background_tasks is not None:
+            background_tasks.add_task(check_budgets_bulk, user_id, user_email, updated_categories)
+        elif user_id and user_email:
+            await check_budgets_bulk(user_id, user_email, updated_categories)
+
     except Exception as e:
-        logging.error(f"Error persisting results or checking budget: {e}")
+        logging.error(f"Error checking budget: {e}")
 
 def persist_insights(supabase, user_id: str, content: str) -> None:
     if not supabase or not user_id or not content:
@@ -446,6 +688,48 @@ def persist_insights(supabase, user_id: str, content: str) -> None:
         logging.error(f"Failed to persist insights: {e}")
 
 
+async def stream_insights(supabase_client: Any, user_id: str) -> AsyncIterator[str]:
+    """
+    Streaming variant of run_insights_agent: yields the insights text as Gemini
+    produces it and persists the full report once the stream completes.
+    """
+    user_profile, category_budgets, category_stats, tag_stats, tx_count = await fetch_insights_inputs(supabase_client, user_id)
+    if not tx_count:
+        logging.warning("No verified transactions found for insights")
+        yield NO_INSIGHTS_DATA_MESSAGE
+        return
+
+    insight_prompt = build_insights_prompt(user_profile, category_stats, category_budgets, tag_stats)
+
+    client = get_gemini_client()
+    if not client:
+        yield "Failed to generate insights. Please try again later."
+        return
+
+    logging.info("Streaming insights with Gemini...")
+    parts: List[str] = []
+    try:
+        stream = await client.aio.models.generate_content_stream(
+            model=GEMINI_MODEL,
+            contents=insight_prompt,
+            config=_generate_config("text/plain")
+        )
+        async for chunk in stream:
+            text = getattr(chunk, "text", "") or ""
+            if text:
+                parts.append(text)
+                yield text
+    except Exception as e:
+        logging.error(f"Gemini streaming call failed: {e}")
+        if not parts:
+            yield "Failed to generate insights. Please try again later."
+            return
+
+    insights_text = "".join(parts)
+    if insights_text:
+        logging.info(f"Insights streamed successfully. Length: {len(insights_text)}")
+        await sb(persist_insights, supabase_client, user_id, insights_text)
+
 def build_graph():
     g = StateGraph(State)
     g.add_node("fetch_unverified", fetch_unverified)
@@ -476,8 +760,11 @@ def build_insights_graph():
     g.add_edge("generate_insights", END)
     return g.compile()
 
-def run_insights_agent(supabase_client: Any, user_id: str) -> Dict[str, Any]:
-    app = build_insights_graph()
+# Graph structure is static; compile once and reuse for every run
+_AGENT_APP = build_graph()
+_INSIGHTS_APP = build_insights_graph()
+
+async def run_insights_agent(supabase_client: Any, user_id: str) -> Dict[str, Any]:
     init: State = {
         "supabase": supabase_client,
         "batch_size": 0,
@@ -488,19 +775,19 @@ def run_insights_agent(supabase_client: Any, user_id: str) -> Dict[str, Any]:
         "path": "",
         "insights": "",
         "user_profile": {},
-        "categories": []
+        "categories": [],
+        "all_high": False
     }
-    final = app.invoke(init)
+    final = await _INSIGHTS_APP.ainvoke(init)
     insights_text = final.get("insights", "")
     if insights_text:
-        persist_insights(supabase_client, user_id, insights_text)
+        await sb(persist_insights, supabase_client, user_id, insights_text)
     return {
         "insights": insights_text
     }
 
-def run_agent(supabase_client: Any, batch_size: int = 100, threshold: float = 0.85, user_id: str = None, user_email: str = None) -> Dict[str, Any]:
+async def run_agent(supabase_client: Any, batch_size: int = 100, threshold: float = 0.85, user_id: str = None, user_email: str = None, background_tasks: Optional[BackgroundTasks] = None) -> Dict[str, Any]:
     logging.info(f"Starting run_agent for user_id={user_id}, batch_size={batch_size}")
-    app = build_graph()
     init: State = {
         "supabase": supabase_client,
         "batch_size": batch_size,
@@ -511,12 +798,13 @@ def run_agent(supabase_client: Any, batch_size: int = 100, threshold: float = 0.
         "path": "",
         "insights": "",
         "user_profile": {},
-        "categories": []
+        "categories": [],
+        "all_high": False
     }
-    final = app.invoke(init)
+    final = await _AGENT_APP.ainvoke(init)
     
     results = final.get("results", [])
-    persist_results(supabase_client, results, user_id, user_email)
+    await persist_results(supabase_client, results, user_id, user_email, background_tasks)
     
     # We don't run insights automatically in run_agent anymore, use run_insights_agent separately
     # Or should we? The graph definition above had generate_insights removed from edges?
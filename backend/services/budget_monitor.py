@@ -1,69 +1,148 @@
-from datetime import datetime
-import calendar
-from core.config import get_supabase_client, TABLE_NAME
+import asyncio
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from core.config import get_supabase_client, sb, TABLE_NAME
+from core.rpc import rpc_or_fallback
 from services.email_service import send_budget_alert
+from utils.helpers import current_month_bounds
 import logging
 
-def check_budget_and_notify(user_id: str, user_email: str, category_name: str):
+def _send_roast_alert(user_email: str, category_name: str, total_spent: float, max_budget: float, user_details: dict):
     from services.ai_roast import generate_roast_message
+    logging.info(f"Budget exceeded for {category_name} (Spent: {total_spent}, Limit: {max_budget}). Sending alert to {user_email}.")
+    roast = generate_roast_message(category_name, total_spent, max_budget, user_details)
+    send_budget_alert(user_email, category_name, total_spent, max_budget, roast_message=roast)
+
+async def _budget_status_rpc(client, user_id: str, names: List[str], start_date: str, end_date: str):
+    """
+    Month spend, budget and user details for the given categories from the
+    check_budget_status SQL function, in one round-trip.
+    """
+    res = await sb(client.rpc("check_budget_status", {
+        "p_user_id": user_id,
+        "p_categories": names,
+        "d_start": start_date,
+        "d_end": end_date,
+    }).execute)
+    rows = res.data or []
+    exceeded = [
+        (r["category"], float(r["total_spent"]), float(r["max_budget"]))
+        for r in rows if float(r["total_spent"]) > float(r["max_budget"])
+    ]
+    user_details = {"name": rows[0].get("user_name"), "age": rows[0].get("user_age")} if rows else {}
+    return exceeded, user_details
+
+async def _budget_status_local(client, user_id: str, names: List[str], start_date: str, end_date: str):
+    """
+    Same result as _budget_status_rpc, from one budgets query and one spend
+    query, plus one users query only if something is over budget.
+    """
+    # 1. Get Category Budget Limits and Current Month Spending (Debit only) together.
+    # Budgets come straight from the table: they must reflect the latest /categories edit.
+    cat_res, tx_res = await asyncio.gather(
+        sb(client.table("categories").select("name,max_budget")
+            .eq("user_id", user_id)
+            .in_("name", names)
+            .gt("max_budget", 0) # 0 means budget disabled
+            .execute),
+        sb(client.table(TABLE_NAME).select("category,amount")
+            .eq("user_id", user_id)
+            .in_("category", names)
+            .eq("transaction_type", "Debit")
+            .gte("date", start_date)
+            .lte("date", end_date)
+            .execute),
+    )
+    budgets = {c["name"]: float(c["max_budget"]) for c in cat_res.data or []}
+    if not budgets:
+        return [], {}
+
+    spent = defaultdict(float)
+    for t in tx_res.data or []:
+        spent[t["category"]] += float(t["amount"])
+
+    exceeded = [(name, spent[name], limit) for name, limit in budgets.items() if spent[name] > limit]
+    if not exceeded:
+        return [], {}
+
+    # Fetch user details
+    user_details = {}
+    try:
+        # Use 'name' instead of 'full_name' as per schema
+        user_res = await sb(
+            client.table("users").select("name, age").eq("id", user_id).single().execute
+        )
+        if user_res.data:
+            user_details["name"] = user_res.data.get("name")
+            user_details["age"] = user_res.data.get("age")
+    except Exception as e:
+        logging.warning(f"Failed to fetch user details for roast: {e}")
+    return exceeded, user_details
+
+async def check_budgets_bulk(user_id: str, user_email: str, category_names: Iterable[str]):
     """
-    Checks if the user's spending for the given category in the current month
-    exceeds the set budget. If so, sends an email alert.
+    Checks the current month's spending for several categories at once and sends
+    an alert for every category whose budget is exceeded. Uses the
+    check_budget_status SQL function when installed, otherwise one query for the
+    budgets and one for the spend, regardless of how many categories are checked.
     """
     if not user_email:
         logging.warning(f"No email provided for user {user_id}. Cannot send budget alert.")
         return
 
-    client = get_supabase_client()
-    if not client:
+    names = sorted({c for c in category_names if c})
+    if not names:
         return
+    client = get_supabase_client()
 
     try:
-        # 1. Get Category Budget Limit
-        res = client.table("categories").select("max_budget").eq("user_id", user_id).eq("name", category_name).execute()
-        if not res.data:
-            return # No budget set or category not found
-        
-        max_budget = float(res.data[0].get("max_budget", 0))
-        if max_budget <= 0:
-            return # Budget disabled
-            
-        # 2. Calculate Current Month Spending
-        now = datetime.now()
-        start_date = now.strftime("%Y-%m-01")
-        _, last_day = calendar.monthrange(now.year, now.month)
-        end_date = now.replace(day=last_day).strftime("%Y-%m-%d")
-        
-        # Query transactions (Debit only)
-        tx_res = client.table(TABLE_NAME).select("amount")\
-            .eq("user_id", user_id)\
-            .eq("category", category_name)\
-            .eq("transaction_type", "Debit")\
-            .gte("date", start_date)\
-            .lte("date", end_date)\
-            .execute()
-            
-        total_spent = sum(float(t["amount"]) for t in tx_res.data)
-        
+        start_date, end_date = current_month_bounds()
+        exceeded, user_details = await rpc_or_fallback(
+            "check_budget_status",
+            lambda: _budget_status_rpc(client, user_id, names, start_date, end_date),
+            lambda: _budget_status_local(client, user_id, names, start_date, end_date),
+        )
+
         # 3. Check and Notify
-        if total_spent > max_budget:
-            logging.info(f"Budget exceeded for {category_name} (Spent: {total_spent}, Limit: {max_budget}). Sending alert to {user_email}.")
-            
-            # Fetch user details
-            user_details = {}
-            try:
-                # Use 'name' instead of 'full_name' as per schema
-                user_res = client.table("users").select("name, age").eq("id", user_id).single().execute()
-                if user_res.data:
-                    user_details["name"] = user_res.data.get("name")
-                    user_details["age"] = user_res.data.get("age")
-            except Exception as e:
-                logging.warning(f"Failed to fetch user details for roast: {e}")
-            
-            # Generate AI Roast
-            roast = generate_roast_message(category_name, total_spent, max_budget, user_details)
-            
-            send_budget_alert(user_email, category_name, total_spent, max_budget, roast_message=roast)
-            
+        await asyncio.gather(*[
+            asyncio.to_thread(_send_roast_alert, user_email, name, total_spent, max_budget, user_details)
+            for name, total_spent, max_budget in exceeded
+        ])
+
     except Exception as e:
-        logging.error(f"Error checking budget for user {user_id}: {e}")
+        logging.error(f"Error checking budgets for user {user_id}: {e}")
+
+class BudgetLoader:
+    """
+    Coalesces budget checks that arrive close together. Category names are
+    collected per user for `window` seconds, then each user gets a single
+    check_budgets_bulk call.
+    """
+    def __init__(self, window: float = 0.05):
+        self.window = window
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def enqueue(self, user_id: str, user_email: str, category_name: str):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._drain())
+        await self._queue.put((user_id, user_email, category_name))
+
+    async def _drain(self):
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self.window)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            pending: Dict[str, Tuple[str, Set[str]]] = {}
+            for user_id, user_email, category_name in batch:
+                pending.setdefault(user_id, (user_email, set()))[1].add(category_name)
+
+            await asyncio.gather(*[
+                check_budgets_bulk(user_id, user_email, names)
+                for user_id, (user_email, names) in pending.items()
+            ], return_exceptions=True)
+
+budget_loader = BudgetLoader()
@@ -1,8 +1,48 @@
 import smtplib
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from core.config import SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, SMTP_FROM_EMAIL
 
+# One logged-in SMTP connection shared by all senders. smtplib connections
+# aren't thread-safe, so the lock is held for the whole send.
+_SMTP_LOCK = threading.Lock()
+_SMTP = {"conn": None}
+
+def _connect():
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
+    server.starttls()
+    server.login(SMTP_USERNAME, SMTP_PASSWORD)
+    return server
+
+def _get_conn():
+    """
+    Returns the cached connection if it still answers NOOP, else reconnects.
+    Must be called with _SMTP_LOCK held.
+    """
+    conn = _SMTP["conn"]
+    if conn is not None:
+        try:
+            if conn.noop()[0] == 250:
+                return conn
+        except Exception:
+            pass
+        _close(conn)
+    conn = _SMTP["conn"] = _connect()
+    return conn
+
+def _close(conn):
+    _SMTP["conn"] = None
+    try:
+        conn.quit()
+    except Exception:
+        pass
+
+def close_smtp_connection():
+    with _SMTP_LOCK:
+        if _SMTP["conn"] is not None:
+            _close(_SMTP["conn"])
+
 def send_email(to_email: str, subject: str, body: str):
     if not SMTP_USERNAME or not SMTP_PASSWORD:
         print("SMTP credentials not set. Skipping email.")
@@ -16,11 +56,13 @@ def send_email(to_email: str, subject: str, body: str):
 
         msg.attach(MIMEText(body, 'html'))
 
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+        with _SMTP_LOCK:
+            try:
+                _get_conn().send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # Dropped between the NOOP and the send; retry once on a fresh connection
+                _SMTP["conn"] = None
+                _get_conn().send_message(msg)
         print(f"Email sent to {to_email}")
         return True
     except Exception as e:
@@ -0,0 +1,50 @@
+from typing import Any, Dict, Optional
+import logging
+import orjson
+from core.config import get_redis_client
+
+# Finished job results only need to outlive the client's polling
+JOB_TTL = 3600
+
+# A job in one of these states won't change again
+TERMINAL_STATUSES = ("done", "error")
+
+# Used when Redis isn't configured (single-worker development setups), and for
+# states that couldn't be written to Redis
+_LOCAL_JOBS: Dict[str, Dict[str, Any]] = {}
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+async def set_status(job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+    """
+    Records a job's state where every API worker can read it.
+    """
+    payload = {"status": status, "result": result, "error": error}
+    redis = get_redis_client()
+    if redis:
+        try:
+            await redis.set(_job_key(job_id), orjson.dumps(payload), ex=JOB_TTL)
+            return
+        except Exception as e:
+            logging.warning(f"Failed to store job {job_id} in Redis: {e}")
+            # Don't leave an older state (e.g. "running") in Redis for other workers to serve
+            try:
+                await redis.delete(_job_key(job_id))
+            except Exception:
+                pass
+    _LOCAL_JOBS[job_id] = payload
+
+async def get_status(job_id: str) -> Optional[Dict[str, Any]]:
+    local = _LOCAL_JOBS.get(job_id)
+    if local and local["status"] in TERMINAL_STATUSES:
+        return local # Finished here, but the final state never reached Redis
+    redis = get_redis_client()
+    if redis:
+        try:
+            cached = await redis.get(_job_key(job_id))
+            if cached:
+                return orjson.loads(cached)
+        except Exception as e:
+            logging.warning(f"Failed to read job {job_id} from Redis: {e}")
+    return local
@@ -1,19 +1,155 @@
-import pdfplumber
+import io
 import re
+import os
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache, partial
 
+# pdfplumber and PyMuPDF are imported on first use: with an arq worker the API
+# process never parses a statement, and neither library is small.
+def _pdfplumber():
+    import pdfplumber
+    return pdfplumber
+
+@lru_cache(maxsize=1)
+def _pymupdf():
+    """
+    PyMuPDF if installed, else None. Text-only extraction is much faster
+    through MuPDF than through pdfminer.
+    """
+    try:
+        import pymupdf
+        return pymupdf
+    except ImportError:
+        return None
+
+# Patterns are compiled once at import; the extractors run them per text line.
+# Digit-only patterns use re.ASCII; the ones with \s stay Unicode so that
+# non-breaking spaces in the PDF text still match.
+_DATE_GPAY = re.compile(r'(\d{2}[A-Za-z]{3},\d{4})', re.ASCII) # e.g. 01Nov,2025
+_DATE_PHONEPE = re.compile(r'([A-Za-z]{3}\s\d{1,2},\s\d{4})') # e.g. Nov 25, 2025
+# DD-MM-YYYY, DD/MM/YYYY, DD MMM YYYY, YYYY-MM-DD
+_DATE_GENERIC = re.compile(r'\b(?:\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\d{1,2}\s+[A-Za-z]{3}\s+\d{2,4}|\d{4}[-/]\d{1,2}[-/]\d{1,2})\b')
+_SBI_AMOUNT = re.compile(r'[\d,]+(?:\.\d+)?\s*[CD]')
+_AMOUNT_NUM = re.compile(r'^\d+(\.\d+)?$', re.ASCII)
+_AMOUNT_2DP = re.compile(r'^\d+(\.\d{1,2})?$', re.ASCII)
+_DASH_PREFIX = re.compile(r'^[-–—]+\s*')
+_RECEIVED = re.compile(r'Received', re.IGNORECASE)
+_PHONEPE_STRIP = re.compile(r'Credit|Debit|INR')
+_NONDIGIT = re.compile(r'[^\d.]', re.ASCII)
+
+# Statement type markers, one alternation per source so a single scan finds
+# every marker present (match.lastgroup names the statement type)
+_TEXT_MARKERS = re.compile(r'(?P<phonepe>PhonePe)|(?P<sbi>SBI Card)|(?P<axis>Axis Account|(?i:AXIS BANK))|(?P<gpay>(?i:google pay))')
+_NAME_MARKERS = re.compile(r'(?P<phonepe>PhonePe)|(?P<sbi>SBI Card)|(?P<gpay>(?i:gpay))')
+
+# SBI/Axis statements with at least this many pages have their tables read
+# page-parallel. Text-only statements are always read serially: MuPDF takes
+# well under a millisecond a page, less than handing a page to a worker.
+PARALLEL_MIN_PAGES = 4
+PAGE_WORKERS = min(os.cpu_count() or 1, 8)
+# At most this many pool tasks (and their results) are outstanding at once
+MAX_IN_FLIGHT = 32
+
+# Words whose tops are this close (in points) are on the same visual row
+_ROW_TOLERANCE = 3
+
+class _KeepNumeric(dict):
+    """
+    str.translate table that keeps digits, '.' and '-' and deletes everything
+    else (currency symbols, commas, C/D suffixes, whitespace).
+    """
+    def __missing__(self, key):
+        self[key] = None
+        return None
+
+_AMOUNT_TABLE = _KeepNumeric({ord(c): c for c in '0123456789.-'})
+
+# Amount strings like '500.00' repeat within and across statements
+@lru_cache(maxsize=2048)
 def parse_amount(amount_str):
     if not amount_str:
         return 0.0
     # Remove currency symbols and commas
-    cleaned = re.sub(r'[^\d.-]', '', str(amount_str))
+    cleaned = str(amount_str).translate(_AMOUNT_TABLE)
     try:
         return float(cleaned)
     except ValueError:
         return 0.0
 
-def extract_gpay_statement(pdf):
-    transactions = []
+def _page_texts(pdf, first_text=None):
+    """
+    Yields (page, text) for every page, reusing the page-0 text that
+    extract_statement_data already read for detection.
+    """
+    for i, page in enumerate(pdf.pages):
+        if i == 0 and first_text is not None:
+            yield page, first_text
+        else:
+            yield page, page.extract_text() or ""
+
+def _columns():
+    """
+    Extractor output: one list per field (struct of arrays) instead of a dict
+    per row. to_records builds the row dicts only for the upsert.
+    """
+    return {"dates": [], "details": [], "amounts": [], "types": []}
+
+def _add_row(cols, date, details, amount, t_type):
+    cols["dates"].append(date)
+    cols["details"].append(details)
+    cols["amounts"].append(amount)
+    cols["types"].append(t_type)
+
+def _fitz_page_text(page):
+    """
+    PyMuPDF page text with words regrouped into visual rows, left to right, the
+    way pdfplumber's extract_text lays them out. PyMuPDF on its own emits each
+    column as a separate block, which would split a date from its amount.
+    """
+    rows = []
+    for x0, top, _, _, word, *_ in sorted(page.get_text("words"), key=lambda w: (w[1], w[0])):
+        if rows and top - rows[-1][0] <= _ROW_TOLERANCE:
+            rows[-1][1].append((x0, word))
+        else:
+            rows.append((top, [(x0, word)]))
+    return "\n".join(" ".join(w for _, w in sorted(words)) for _, words in rows)
+
+def _plumber_source(source):
+    # pdfplumber takes a path or a binary file object
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+def _open_text_pdf(source):
+    """
+    Opens the PDF (a path or the file's bytes) for text-only extraction:
+    PyMuPDF when installed, else pdfplumber.
+    """
+    pymupdf = _pymupdf()
+    if pymupdf is None:
+        return _pdfplumber().open(_plumber_source(source))
+    return pymupdf.open(stream=source) if isinstance(source, bytes) else pymupdf.open(source)
+
+def _text_pages(doc):
+    return doc if _pymupdf() is not None else doc.pages
+
+def _page_text(page):
+    if _pymupdf() is not None:
+        return _fitz_page_text(page)
+    return page.extract_text() or ""
+
+def _iter_page_text(pages, first_text=None):
+    """
+    Text of each page of a document from _open_text_pdf, reusing the page-0
+    text that extract_statement_data already read for detection.
+    """
+    for i, page in enumerate(pages):
+        yield first_text if i == 0 and first_text is not None else _page_text(page)
+
+def extract_gpay_statement(texts):
+    transactions = _columns()
     # GPay statements often don't extract well as standard tables.
     # We might need to look for specific patterns or text blocks.
     # Based on analysis: "Date&time Transactiondetails Amount"
@@ -23,10 +159,7 @@ def extract_gpay_statement(pdf):
     # Let's try to iterate through pages and look for transaction blocks
     # Pattern seen: "01Nov,2025 Paidto..."
     
-    date_pattern = r'(\d{2}[A-Za-z]{3},\d{4})'
-    
-    for page in pdf.pages:
-        text = page.extract_text()
+    for text in texts:
         if not text:
             continue
             
@@ -36,7 +169,9 @@ def extract_gpay_statement(pdf):
         for i, line in enumerate(lines):
             # Very basic heuristic for GPay based on the text dump
             # Real implementation needs to be robust against layout variations
-            match = re.search(date_pattern, line)
+            # Both date formats contain a comma; most header/balance lines
+            # don't, so a substring test spares them the regex
+            match = _DATE_GPAY.search(line) if ',' in line else None
             if match:
                 current_date = match.group(1)
                 # Try to extract amount and details from this or next lines
@@ -49,30 +184,22 @@ def extract_gpay_statement(pdf):
                 if len(parts) >= 2:
                     details = parts[0].strip()
                     details = details.replace(current_date, "").strip()
-                    details = re.sub(date_pattern, "", details).strip()
+                    details = _DATE_GPAY.sub("", details).strip()
                     amount_str = parts[1].split()[0] # Take first part after symbol
                     
                     t_type = "Credit" if "Received" in details else "Debit"
                     
-                    transactions.append({
-                        "date": current_date,
-                        "transaction_details": details,
-                        "amount": parse_amount(amount_str),
-                        "type": t_type
-                    })
+                    _add_row(transactions, current_date, details, parse_amount(amount_str), t_type)
     return transactions
 
-def extract_phonepe_statement(pdf):
-    transactions = []
+def extract_phonepe_statement(texts):
+    transactions = _columns()
     
     # Heuristic text-based extraction since table extraction is failing to map correctly
     # Pattern: "Date Transaction Details Type Amount" header
     # Rows: "Nov 25, 2025 Received from... Credit INR 3000.00"
     
-    date_pattern = r'([A-Za-z]{3}\s\d{1,2},\s\d{4})' # e.g. Nov 25, 2025
-    
-    for page in pdf.pages:
-        text = page.extract_text()
+    for text in texts:
         if not text: continue
         
         # Split text into chunks or lines. 
@@ -83,7 +210,7 @@ def extract_phonepe_statement(pdf):
         
         for i, line in enumerate(lines):
             # Check for start of a transaction (Date)
-            date_match = re.search(date_pattern, line)
+            date_match = _DATE_PHONEPE.search(line) if ',' in line else None
             
             if date_match and ("Credit" in line or "Debit" in line):
                 # Single line transaction?
@@ -108,12 +235,7 @@ def extract_phonepe_statement(pdf):
                     details_part = line.split(split_keyword)[0]
                     details = details_part.replace(date_str, "").strip()
                     
-                    transactions.append({
-                        "date": date_str,
-                        "transaction_details": details,
-                        "amount": parse_amount(amount_str),
-                        "type": t_type
-                    })
+                    _add_row(transactions, date_str, details, parse_amount(amount_str), t_type)
                     continue
                 except:
                     pass
@@ -144,8 +266,8 @@ def extract_phonepe_statement(pdf):
                 elif "Debit" in line or "Paid" in line: 
                     t_type = "Debit"
                 
-                details = line.replace(date_str, "").replace("Credit", "").replace("Debit", "").replace("INR", "").strip()
-                details = re.sub(r"^[-–—]+\s*", "", details)
+                details = _PHONEPE_STRIP.sub("", line.replace(date_str, "")).strip()
+                details = _DASH_PREFIX.sub("", details)
                 
                 # Look at next few lines for Amount
                 amount = 0.0
@@ -166,145 +288,133 @@ def extract_phonepe_statement(pdf):
                          possible_amt_str = possible_amt_str.replace(',', '')
                          
                          # Check if it looks like a number
-                         if re.match(r'^\d+(\.\d+)?$', possible_amt_str):
+                         if _AMOUNT_NUM.match(possible_amt_str):
                              amount = parse_amount(possible_amt_str)
                              break
                 
                 if amount > 0:
                     if t_type == "Debit":
-                        if re.search(r"Received", details, re.IGNORECASE):
+                        if _RECEIVED.search(details):
                             t_type = "Credit"
-                    transactions.append({
-                        "date": date_str,
-                        "transaction_details": details,
-                        "amount": amount,
-                        "type": t_type
-                    })
+                    _add_row(transactions, date_str, details, amount, t_type)
 
     return transactions
 
-def extract_sbi_statement(pdf):
-    transactions = []
+def _is_sbi_transactions_table(table):
+    if not table or len(table) < 2:
+        return False
+    header = table[0]
+    header_texts = [str(c) if c else '' for c in header]
+    has_date = any('Date' in h for h in header_texts)
+    has_amount_header = any('Amount' in h for h in header_texts)
+    if not (has_date and has_amount_header):
+        return False
+    for row in table[1:]:
+        if len(row) >= 3 and row[2] and _SBI_AMOUNT.search(str(row[2])):
+            return True
+    return False
+
+def _sbi_page_rows(page, text, transactions):
     # Table headers: ['Date', 'Transaction Details...', 'Amount ( ` )']
     # The amount column has 'C' or 'D' suffix often
-    
-    def is_sbi_transactions_table(table):
-        if not table or len(table) < 2:
-            return False
-        header = table[0]
-        header_texts = [str(c) if c else '' for c in header]
-        has_date = any('Date' in h for h in header_texts)
-        has_amount_header = any('Amount' in h for h in header_texts)
-        if not (has_date and has_amount_header):
-            return False
-        amount_pattern = re.compile(r'[\d,]+(?:\.\d+)?\s*[CD]')
-        for row in table[1:]:
-            if len(row) >= 3 and row[2] and amount_pattern.search(str(row[2])):
-                return True
-        return False
-    
-    for page in pdf.pages:
-        tables = page.extract_tables()
-        for table in tables:
-            if not table: 
-                continue
-            if not is_sbi_transactions_table(table):
-                continue
-            
-            # Check headers
-            start_idx = 0
-            if table[0] and 'Date' in str(table[0][0]):
-                start_idx = 1
-            
-            # Note: SBI sample analysis showed a messy table where columns might be merged
-            # Row 0: ['Date', 'Transaction Details...', 'Amount']
-            # Row 1: ['16 Nov 25\n26 Nov 25...', 'CARD CASHBACK...', '1,014.00 C\n...']
-            # This indicates pdfplumber merged multiple rows into one cell due to lack of grid lines
-            
-                for row in table[start_idx:]:
-                    # If cells contain newlines, we might need to split them and align
-                    if len(row) >= 3 and row[0] and row[1] and row[2]:
-                        dates = str(row[0]).split('\n')
-                        details = str(row[1]).split('\n')
-                        amounts = str(row[2]).split('\n')
-                        
-                        # This is a heuristic assuming equal number of lines per cell, which is risky
-                        # But often true for these specific PDF structures
-                        count = min(len(dates), len(details), len(amounts))
-                        
-                        for i in range(count):
-                            amt_raw = amounts[i]
-                            t_type = "Credit" if 'C' in amt_raw else "Debit" if 'D' in amt_raw else "Debit"
-                            
-                            amt_val = parse_amount(amt_raw)
-                            if amt_val > 0:
-                                transactions.append({
-                                    "date": dates[i],
-                                    "transaction_details": details[i],
-                                    "amount": amt_val,
-                                    "type": t_type
-                                })
+    # Table extraction is far costlier than text; a page whose text lacks
+    # the Date/Amount header can't hold a table that passes the check below
+    if 'Date' not in text or 'Amount' not in text:
+        return
+    tables = page.extract_tables()
+    for table in tables:
+        if not table: 
+            continue
+        if not _is_sbi_transactions_table(table):
+            continue
+
+        # Check headers
+        start_idx = 0
+        if table[0] and 'Date' in str(table[0][0]):
+            start_idx = 1
+
+        # Note: SBI sample analysis showed a messy table where columns might be merged
+        # Row 0: ['Date', 'Transaction Details...', 'Amount']
+        # Row 1: ['16 Nov 25\n26 Nov 25...', 'CARD CASHBACK...', '1,014.00 C\n...']
+        # This indicates pdfplumber merged multiple rows into one cell due to lack of grid lines
+
+        for row in table[start_idx:]:
+            # If cells contain newlines, we might need to split them and align
+            if len(row) >= 3 and row[0] and row[1] and row[2]:
+                dates = str(row[0]).split('\n')
+                details = str(row[1]).split('\n')
+                amounts = str(row[2]).split('\n')
+
+                # This is a heuristic assuming equal number of lines per cell, which is risky
+                # But often true for these specific PDF structures (zip stops at the shortest)
+                for date_str, detail, amt_raw in zip(dates, details, amounts):
+                    t_type = "Credit" if 'C' in amt_raw else "Debit"
+
+                    amt_val = parse_amount(amt_raw)
+                    if amt_val > 0:
+                        _add_row(transactions, date_str, detail, amt_val, t_type)
+
+def extract_sbi_statement(pdf, first_text=None):
+    transactions = _columns()
+    for page, text in _page_texts(pdf, first_text):
+        _sbi_page_rows(page, text, transactions)
     return transactions
 
-def extract_axis_statement(pdf):
-    transactions = []
+def _axis_page_rows(page, text, transactions):
     # Table headers: ['Tran Date', 'Chq No', 'Particulars', 'Debit', 'Credit', 'Balance', 'Init. Br']
-    
-    for page in pdf.pages:
-        tables = page.extract_tables()
-        for table in tables:
-            if not table: continue
-            
-            start_idx = 0
-            if table[0] and 'Tran Date' in str(table[0][0]):
-                start_idx = 1
-                
-            for row in table[start_idx:]:
-                if len(row) < 5: continue
-                
-                date_str = row[0]
-                if not date_str: continue # Skip empty rows (like opening balance sometimes)
-                
-                details = row[2].replace('\n', ' ') if row[2] else ""
-                debit = row[3]
-                credit = row[4]
-                
-                amount = 0.0
+    # Continuation pages don't always repeat the 'Tran Date' header, so only
+    # pages without any text (no rows to read) are skipped
+    if not text.strip():
+        return
+    tables = page.extract_tables()
+    for table in tables:
+        if not table: continue
+
+        start_idx = 0
+        if table[0] and 'Tran Date' in str(table[0][0]):
+            start_idx = 1
+
+        for row in table[start_idx:]:
+            if len(row) < 5: continue
+
+            date_str = row[0]
+            if not date_str: continue # Skip empty rows (like opening balance sometimes)
+
+            details = row[2].replace('\n', ' ') if row[2] else ""
+            debit = row[3]
+            credit = row[4]
+
+            amount = 0.0
+            t_type = "Debit"
+
+            if debit and debit.strip():
+                amount = parse_amount(debit)
                 t_type = "Debit"
-                
-                if debit and debit.strip():
-                    amount = parse_amount(debit)
-                    t_type = "Debit"
-                elif credit and credit.strip():
-                    amount = parse_amount(credit)
-                    t_type = "Credit"
-                
-                if amount > 0:
-                    transactions.append({
-                        "date": date_str,
-                        "transaction_details": details,
-                        "amount": amount,
-                        "type": t_type
-                    })
+            elif credit and credit.strip():
+                amount = parse_amount(credit)
+                t_type = "Credit"
+
+            if amount > 0:
+                _add_row(transactions, date_str, details, amount, t_type)
+
+def extract_axis_statement(pdf, first_text=None):
+    transactions = _columns()
+    for page, text in _page_texts(pdf, first_text):
+        _axis_page_rows(page, text, transactions)
     return transactions
 
-def extract_generic_statement(pdf):
-    transactions = []
+def extract_generic_statement(texts):
+    transactions = _columns()
     print("Attempting generic extraction...")
     
-    # Generic regex for Date (DD-MM-YYYY, DD/MM/YYYY, DD MMM YYYY, etc.)
-    # 25 Nov 2025, 25-11-2025, 2025-11-25
-    date_pattern = re.compile(r'\b(?:\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\d{1,2}\s+[A-Za-z]{3}\s+\d{2,4}|\d{4}[-/]\d{1,2}[-/]\d{1,2})\b')
-    
-    for page in pdf.pages:
-        text = page.extract_text()
+    for text in texts:
         if not text:
             continue
             
         lines = text.split('\n')
         for line in lines:
             # Look for a date
-            date_match = date_pattern.search(line)
+            date_match = _DATE_GENERIC.search(line)
             if date_match:
                 # Look for an amount
                 # Heuristic: Amount is usually at the end, contains digits and maybe decimal
@@ -320,11 +430,11 @@ def extract_generic_statement(pdf):
                 # Try to find amount from right to left
                 for part in reversed(parts):
                     # Clean part
-                    clean_part = re.sub(r'[^\d.]', '', part)
+                    clean_part = _NONDIGIT.sub('', part)
                     if not clean_part:
                         continue
                     # Avoid date parts like '2025' or small integers unless they look like currency
-                    if re.match(r'^\d+(\.\d{1,2})?$', clean_part):
+                    if _AMOUNT_2DP.match(clean_part):
                         try:
                             val = float(clean_part)
                             # Simple heuristic: filter out years or days if they are standalone
@@ -346,52 +456,161 @@ def extract_generic_statement(pdf):
                     # Remove amount from details if possible (rough)
                     # For now just keep it simple
                     
-                    transactions.append({
-                        "date": date_str,
-                        "transaction_details": details,
-                        "amount": amount,
-                        "type": t_type
-                    })
+                    _add_row(transactions, date_str, details, amount, t_type)
     
     return transactions
 
-def extract_statement_data(file_path, original_filename=None):
-    transactions = []
+_TABLE_PAGE_ROWS = {"sbi": _sbi_page_rows, "axis": _axis_page_rows}
+_page_pool = None
+_page_pool_lock = threading.Lock()
+
+def _get_page_pool():
+    """
+    Process pool for PDF parsing (pages of one statement, or whole statements
+    in a batch), started on first use. Workers are spawned
+    rather than forked because the API and arq processes are multi-threaded.
+    """
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(max_workers=PAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _page_pool
+
+def shutdown_page_pool():
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is not None:
+            _page_pool.shutdown(wait=False, cancel_futures=True)
+            _page_pool = None
+
+def _ordered_pool_map(fn, *iterables):
+    """
+    Like Executor.map, but submits lazily so that no more than MAX_IN_FLIGHT
+    tasks are queued and their results held at once. Yields in input order,
+    so the output matches the serial path.
+    """
+    pool = _get_page_pool()
+    pending = deque()
+    for args in zip(*iterables):
+        if len(pending) >= MAX_IN_FLIGHT:
+            yield pending.popleft().result()
+        pending.append(pool.submit(fn, *args))
+    while pending:
+        yield pending.popleft().result()
+
+def _page_ranges(page_count, parts):
+    # Contiguous [start, stop) ranges, as even as possible
+    step = -(-page_count // parts)
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+def _table_rows_in_range(kind, file_path, start, stop):
+    # Each worker opens the PDF once for its whole range of pages
+    transactions = _columns()
+    with _pdfplumber().open(file_path) as pdf:
+        for page in pdf.pages[start:stop]:
+            _TABLE_PAGE_ROWS[kind](page, page.extract_text() or "", transactions)
+    return transactions
+
+def _statement_table_rows(kind, file_path, page_count, first_text, parallel=True):
+    """
+    Runs the SBI/Axis table extractor. Long statements are split into one
+    contiguous page range per pool worker.
+    """
+    if parallel and PAGE_WORKERS > 1 and page_count >= PARALLEL_MIN_PAGES:
+        try:
+            transactions = _columns()
+            ranges = _page_ranges(page_count, min(PAGE_WORKERS, page_count))
+            for cols in _ordered_pool_map(partial(_table_rows_in_range, kind, file_path), *zip(*ranges)):
+                for key, values in cols.items():
+                    transactions[key].extend(values)
+            return transactions
+        except Exception as e:
+            print(f"Parallel page extraction failed, reading pages serially: {e}")
+    # Table extractors need pdfplumber's table finder
+    with _pdfplumber().open(_plumber_source(file_path)) as pdf:
+        extractor = extract_sbi_statement if kind == "sbi" else extract_axis_statement
+        return extractor(pdf, first_text)
+
+def detect_statement_type(first_page_text, name_check):
+    """
+    Returns 'phonepe', 'sbi', 'axis', 'gpay' or None, checked in that order.
+    """
+    hits = {m.lastgroup for m in _TEXT_MARKERS.finditer(first_page_text)}
+    hits.update(m.lastgroup for m in _NAME_MARKERS.finditer(name_check))
+    for kind in ("phonepe", "sbi", "axis", "gpay"):
+        if kind in hits:
+            return kind
+    return None
+
+def extract_statement_data(file_path, original_filename=None, parallel=True):
+    """
+    Detects the statement type and extracts its transactions as column lists.
+    file_path may also be the PDF's bytes or a binary file object; those are
+    read serially, since pool workers reopen the file by path.
+    """
+    transactions = _columns()
+    if isinstance(file_path, (str, os.PathLike)):
+        file_path = os.fspath(file_path)
+        label = file_path
+    else:
+        if not isinstance(file_path, bytes):
+            file_path = file_path.read() if hasattr(file_path, "read") else bytes(file_path)
+        label = original_filename or "<in-memory PDF>"
+        parallel = False
     
     try:
-        with pdfplumber.open(file_path) as pdf:
+        with _open_text_pdf(file_path) as doc:
+            pages = _text_pages(doc)
             # Detect statement type based on content of first page
             first_page_text = ""
             try:
-                if pdf.pages:
-                    first_page_text = pdf.pages[0].extract_text() or ""
+                if len(pages):
+                    first_page_text = _page_text(pages[0])
             except Exception as e:
                 print(f"Warning: Failed to extract text from first page: {e}")
 
             # Combine file_path and original_filename for checking
-            name_check = file_path
-            if original_filename:
+            name_check = label
+            if original_filename and original_filename != label:
                 name_check += " " + original_filename
             
             print(f"Analyzing PDF: {original_filename}")
+            # Extractors reuse this instead of reading page 0 again
+            first_text = first_page_text or None
+            kind = detect_statement_type(first_page_text, name_check)
             
-            if "PhonePe" in first_page_text or "PhonePe" in name_check:
+            if kind == "phonepe":
                 print("Detected PhonePe Statement")
-                transactions = extract_phonepe_statement(pdf)
-            elif "SBI Card" in first_page_text or "SBI Card" in name_check: 
+                transactions = extract_phonepe_statement(_iter_page_text(pages, first_text))
+            elif kind == "sbi":
                 print("Detected SBI Card Statement")
-                transactions = extract_sbi_statement(pdf)
-            elif "Axis Account" in first_page_text or "AXIS BANK" in first_page_text.upper():
+                transactions = _statement_table_rows("sbi", file_path, len(pages), first_text, parallel)
+            elif kind == "axis":
                 print("Detected Axis Bank Statement")
-                transactions = extract_axis_statement(pdf)
-            elif "gpay" in name_check.lower() or "google pay" in first_page_text.lower():
+                transactions = _statement_table_rows("axis", file_path, len(pages), first_text, parallel)
+            elif kind == "gpay":
                 print("Detected GPay Statement")
-                transactions = extract_gpay_statement(pdf)
+                transactions = extract_gpay_statement(_iter_page_text(pages, first_text))
             else:
                 print("Unknown statement type. Attempting generic extraction...")
-                transactions = extract_generic_statement(pdf)
+                transactions = extract_generic_statement(_iter_page_text(pages, first_text))
                 
     except Exception as e:
-        print(f"Error processing {file_path}: {e}")
+        print(f"Error processing {label}: {e}")
         
     return transactions
+
+def extract_statements(files):
+    """
+    Extracts several statements at once, one file per pool worker (each file's
+    pages are then read serially in its worker). files is a list of
+    (file_path, original_filename) pairs; results come back in the same order.
+    """
+    if len(files) < 2:
+        return [extract_statement_data(path, name) for path, name in files]
+    paths, names = zip(*files)
+    try:
+        return list(_ordered_pool_map(partial(extract_statement_data, parallel=False), paths, names))
+    except Exception as e:
+        print(f"Parallel extraction failed, extracting files serially: {e}")
+        return [extract_statement_data(path, name) for path, name in files]
\ No newline at end of file
@@ -0,0 +1,31 @@
+-- Month spend against budget for a set of categories, plus the user's name and
+-- age for the roast, so a budget check is a single round-trip. Only categories
+-- with a budget (max_budget > 0) are returned. Run once in the Supabase SQL editor.
+create index if not exists transactions_budget_idx
+  on transactions (user_id, category, transaction_type, date);
+
+create or replace function check_budget_status(p_user_id uuid, p_categories text[], d_start date, d_end date)
+returns table (category text, total_spent numeric, max_budget numeric, user_name text, user_age int)
+language sql
+stable
+as $$
+  select
+    c.name as category,
+    coalesce((
+      select sum(t.amount)
+      from transactions t
+      where t.user_id = p_user_id
+        and t.category = c.name
+        and t.transaction_type = 'Debit'
+        and t.date >= d_start
+        and t.date <= d_end
+    ), 0) as total_spent,
+    c.max_budget,
+    u.name as user_name,
+    u.age as user_age
+  from categories c
+  left join users u on u.id = p_user_id
+  where c.user_id = p_user_id
+    and c.name = any(p_categories)
+    and c.max_budget > 0;
+$$;
@@ -0,0 +1,34 @@
+-- Budget adherence and impulse-buy scores for /auth/profile, computed in the
+-- database so the route doesn't have to download the month's transactions.
+-- Run once in the Supabase SQL editor.
+create or replace function profile_scores(uid uuid, d_start date, d_end date)
+returns table (budget_score numeric, impulse_score numeric)
+language sql
+stable
+as $$
+  with spend as (
+    select t.category, t.amount, t.tags
+    from transactions t
+    where t.user_id = uid
+      and t.transaction_type = 'Debit'
+      and t.date >= d_start
+      and t.date <= d_end
+  ),
+  per_category as (
+    select c.max_budget as budget_limit, coalesce(sum(s.amount), 0) as spent
+    from categories c
+    left join spend s on s.category = c.name
+    where c.user_id = uid and c.max_budget > 0
+    group by c.name, c.max_budget
+  )
+  select
+    -- No budgeted categories: sum(budget_limit) is null, so the score stays 100
+    (select greatest(0, coalesce(100 - sum(greatest(spent - budget_limit, 0)) / nullif(sum(budget_limit), 0) * 100, 100))
+     from per_category) as budget_score,
+    coalesce(
+      (select sum(amount) filter (where tags && array['impulse', 'DopamineHit', 'RetailTherapy', 'BoredomBuy', 'PaydaySplurge']::text[])
+              / nullif(sum(amount), 0) * 100
+       from spend),
+      0
+    ) as impulse_score;
+$$;
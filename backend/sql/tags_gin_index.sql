@@ -0,0 +1,3 @@
+-- Lets tag filters (tags && ..., tags @> ...) on transactions use an index.
+-- Run once in the Supabase SQL editor.
+create index if not exists transactions_tags_gin on transactions using gin (tags);
@@ -0,0 +1,52 @@
+-- Overview counts and chart series for /transactions/stats, aggregated in the
+-- database so only the summary crosses the wire. d_start/d_end may be null
+-- (no date filter). Run once in the Supabase SQL editor.
+create or replace function transaction_stats(uid uuid, d_start date, d_end date, target_tags text[])
+returns jsonb
+language sql
+stable
+as $$
+  with tx as (
+    select
+      t.amount,
+      t.transaction_type,
+      coalesce(t.category, 'Uncategorized') as category,
+      t.tags,
+      coalesce(t.statement_type, 'Unknown') as statement_type,
+      t.verification_status
+    from transactions t
+    where t.user_id = uid
+      and (d_start is null or t.date >= d_start)
+      and (d_end is null or t.date <= d_end)
+  )
+  select jsonb_build_object(
+    'overview', (
+      select jsonb_build_object(
+        'total_transactions', count(*),
+        'unverified', count(*) filter (where verification_status = 'unverified'),
+        'flagged', count(*) filter (where verification_status = 'required_human_verification')
+      )
+      from tx
+    ),
+    'charts', jsonb_build_object(
+      'category_debits', (
+        select coalesce(jsonb_object_agg(category, s), '{}'::jsonb)
+        from (select category, sum(amount) as s from tx where transaction_type = 'Debit' group by category) q
+      ),
+      'tag_spending', (
+        select coalesce(jsonb_object_agg(wanted.tag, coalesce(q.s, 0)), '{}'::jsonb)
+        from unnest(target_tags) as wanted(tag)
+        left join (
+          select tag, sum(amount) as s
+          from tx, unnest(tx.tags) as tag
+          where transaction_type = 'Debit'
+          group by tag
+        ) q on q.tag = wanted.tag
+      ),
+      'payment_type_distribution', (
+        select coalesce(jsonb_object_agg(statement_type, s), '{}'::jsonb)
+        from (select statement_type, sum(amount) as s from tx group by statement_type) q
+      )
+    )
+  );
+$$;
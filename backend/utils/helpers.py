@@ -1,16 +1,74 @@
 import re
+import time
+import calendar
 from datetime import datetime
-from supabase import create_client
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from supabase import create_client, ClientOptions
 import os
 
+# One keep-alive pool shared by every Supabase sub-client (PostgREST, Auth, Storage)
+SUPABASE_HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+SUPABASE_HTTP_TIMEOUT = 120
+
+# Statement rows are upserted in chunks of this size, a few chunks at a time
+UPSERT_CHUNK_SIZE = 500
+UPSERT_WORKERS = 4
+UPSERT_ATTEMPTS = 2
+
+_MONTH_RE = re.compile(r"(\d{4})-(\d{1,2})")
+_PAY_PREFIXES = ("paid to", "paidto", "received from", "receivedfrom")
+
+def month_bounds(year, month):
+    """
+    First and last day of a month as YYYY-MM-DD strings.
+    """
+    _, last_day = calendar.monthrange(year, month)
+    return f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-{last_day:02d}"
+
+@lru_cache(maxsize=1)
+def _current_month_bounds(minute):
+    now = datetime.now()
+    return month_bounds(now.year, now.month)
+
+def current_month_bounds():
+    # Recomputed at most once a minute
+    return _current_month_bounds(int(time.time() // 60))
+
+def parse_month_bounds(month):
+    """
+    Bounds for a YYYY-MM string. Raises ValueError if it isn't a valid month.
+    """
+    m = _MONTH_RE.fullmatch(month.strip())
+    if not m or not 1 <= int(m[2]) <= 12:
+        raise ValueError(f"Invalid month: {month}")
+    return month_bounds(int(m[1]), int(m[2]))
+
+DATE_FORMATS = ("%d%b,%Y", "%d %b %y", "%d-%m-%Y", "%b %d, %Y", "%d %b %Y")
+
+# A statement uses one date format throughout, so the last match is tried first
+_last_fmt = [None]
+
+# Statements repeat the same dates, details and types across many rows
+@lru_cache(maxsize=4096)
 def normalize_date(date_str):
     if not date_str:
         return None
     s = str(date_str).strip()
-    fmts = ["%d%b,%Y", "%d %b %y", "%d-%m-%Y", "%b %d, %Y", "%d %b %Y"]
-    for fmt in fmts:
+    last = _last_fmt[0]
+    if last:
         try:
-            return datetime.strptime(s, fmt).date().isoformat()
+            return datetime.strptime(s, last).date().isoformat()
+        except Exception:
+            pass
+    for fmt in DATE_FORMATS:
+        if fmt == last:
+            continue
+        try:
+            result = datetime.strptime(s, fmt).date().isoformat()
+            _last_fmt[0] = fmt
+            return result
         except Exception:
             continue
     try:
@@ -18,25 +76,34 @@ def normalize_date(date_str):
     except Exception:
         return None
 
+@lru_cache(maxsize=4096)
 def clean_details(details):
     if not details:
         return ""
-    s = str(details)
-    s = re.sub(r"^(Paid\s*to|Paidto|Received\s*from|Receivedfrom)\s*", "", s, flags=re.IGNORECASE)
-    s = re.sub(r"^[-–—]+\s*", "", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    # Collapse whitespace first so "Paid  to" matches the prefixes below
+    s = " ".join(str(details).split())
+    low = s.lower()
+    for prefix in _PAY_PREFIXES:
+        if low.startswith(prefix):
+            s = s[len(prefix):].lstrip()
+            break
+    return s.lstrip("-–—").lstrip()
 
 def normalize_type(t, details):
+    # Extractors almost always set the type; no cache lookup needed then
     if t in ("Debit", "Credit"):
         return t
-    d = (details or "").lower()
+    return _type_from_details((details or "").lower())
+
+@lru_cache(maxsize=1024)
+def _type_from_details(d):
     if "received" in d:
         return "Credit"
     if "paid" in d or "debit" in d:
         return "Debit"
     return "Debit" if ("imps" in d or "ecom pur" in d or "pos" in d) else "Debit"
 
+@lru_cache(maxsize=2048)
 def normalize_amount(a):
     try:
         return round(float(a), 2)
@@ -44,21 +111,27 @@ def normalize_amount(a):
         return 0.0
 
 def to_records(data, statement_type=None, user_id=None):
-    records = []
-    for row in data:
-        record = {
-            "date": normalize_date(row.get("date")),
-            "transaction_details": clean_details(row.get("transaction_details")),
-            "transaction_type": normalize_type(row.get("type"), row.get("transaction_details")),
-            "amount": normalize_amount(row.get("amount")),
-            "verification_status": "unverified",
-            "statement_type": statement_type,
+    """
+    Row dicts for the upsert from the extractors' column lists
+    (dates, details, amounts, types).
+    """
+    # Normalizers bound to locals for the per-row loop
+    nd, cd, nt, na = normalize_date, clean_details, normalize_type, normalize_amount
+    base = {"verification_status": "unverified", "statement_type": statement_type}
+    if user_id:
+        base["user_id"] = user_id
+    return [
+        {
+            **base,
+            "date": nd(date),
+            "transaction_details": cd(details),
+            "transaction_type": nt(t_type, details),
+            "amount": na(amount),
         }
-        if user_id:
-            record["user_id"] = user_id
-        records.append(record)
-    return records
+        for date, details, amount, t_type in zip(data["dates"], data["details"], data["amounts"], data["types"])
+    ]
 
+@lru_cache(maxsize=256)
 def normalize_statement_type(s):
     if not s:
         return None
@@ -71,24 +144,40 @@ def normalize_statement_type(s):
         return "UPI"
     return None
 
+def _upsert_chunk(client, table_name, batch):
+    for attempt in range(1, UPSERT_ATTEMPTS + 1):
+        try:
+            # Use upsert with ignore_duplicates=True to skip existing records
+            client.table(table_name).upsert(
+                batch, 
+                on_conflict="date,transaction_details,transaction_type,amount", 
+                ignore_duplicates=True
+            ).execute()
+            return
+        except Exception as e:
+            print(f"Supabase insert error ({len(batch)} rows, attempt {attempt}/{UPSERT_ATTEMPTS}): {e}")
+
 def insert_supabase(client, table_name, records):
     if not client or not records or not table_name:
         return
-    try:
-        # Use upsert with ignore_duplicates=True to skip existing records
-        # This prevents the entire batch from failing due to a single duplicate
-        client.table(table_name).upsert(
-            records, 
-            on_conflict="date,transaction_details,transaction_type,amount", 
-            ignore_duplicates=True
-        ).execute()
-    except Exception as e:
-        print(f"Supabase insert error: {e}")
+    # Chunks stay under the payload limit and a failing chunk doesn't take the
+    # rest of the statement down with it; a few are sent at once to overlap RTTs.
+    chunks = [records[i:i + UPSERT_CHUNK_SIZE] for i in range(0, len(records), UPSERT_CHUNK_SIZE)]
+    if len(chunks) == 1:
+        _upsert_chunk(client, table_name, chunks[0])
+        return
+    with ThreadPoolExecutor(max_workers=min(UPSERT_WORKERS, len(chunks))) as pool:
+        list(pool.map(lambda batch: _upsert_chunk(client, table_name, batch), chunks))
 
 def create_supabase_client(url, key):
     if not url or not key:
         return None
     try:
-        return create_client(url, key)
+        http_client = httpx.Client(
+            limits=SUPABASE_HTTP_LIMITS,
+            timeout=SUPABASE_HTTP_TIMEOUT,
+            follow_redirects=True
+        )
+        return create_client(url, key, options=ClientOptions(httpx_client=http_client))
     except Exception:
         return None
@@ -0,0 +1,25 @@
+"""
+arq worker for statement processing, so PDF extraction runs outside the API process.
+The API only enqueues jobs when USE_ARQ_WORKER=1 (and REDIS_URL) is set; this
+worker must then be running. Start it from the backend directory, on the API's
+host or with a shared uploads/ (it reads the temp files the API writes there):
+
+    arq worker.WorkerSettings
+"""
+import asyncio
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+from arq.connections import RedisSettings
+from core.config import REDIS_URL
+from api.routes.upload import process_statement_task, process_statements_task
+
+async def process_statement(ctx, path, job_id, original_filename=None, statement_type=None, user_id=None):
+    await asyncio.to_thread(process_statement_task, path, job_id, original_filename, statement_type, user_id)
+
+async def process_statements(ctx, files, job_id, user_id=None):
+    await asyncio.to_thread(process_statements_task, files, job_id, user_id)
+
+class WorkerSettings:
+    functions = [process_statement, process_statements]
+    redis_settings = RedisSettings.from_dsn(REDIS_URL or "redis://localhost:6379")